@@ -2,11 +2,13 @@
 
 import tkinter as tk
 from tkinter import filedialog
-import win32gui
-import win32con
+import os
 from pathlib import Path
 from datetime import datetime
+import threading
 import appdirs
+from KeyIndex import KeyIndexer
+from Profiler import PROFILER
 
 
 class KeyMonitorBanner:
@@ -16,18 +18,29 @@ class KeyMonitorBanner:
     Handles everything related to the application window.
     """
 
-    def __init__(self, attach_to=0):
+    def __init__(self, attach_to=0, desktop=None, root=None):
         """
         Contruct a window.
 
         Args:
             attach_to (int): A handle to the "sibling" window (the key loader window)
                              (default 0).
+            desktop (Win32Desktop, SimulatedDesktop): Used to find and move
+                                                      windows
+                                                      (default Win32Desktop).
+            root (tkinter.Tk): The Tk root to build the window in
+                               (default a new one).
         """
 
-        self.root = tk.Tk()
+        if desktop is None:
+            from Desktop import Win32Desktop
+            desktop = Win32Desktop()
+
+        self.desktop = desktop
+
+        self.root = root if root is not None else tk.Tk()
         self.root.title("Key File Monitor")
-        self.root.geometry('500x125')
+        self.root.geometry('500x150')
 
         # This will update size and position
         self._update_window_handle(attach_to)
@@ -35,6 +48,7 @@ class KeyMonitorBanner:
         # UI variables
         self._key_filename = tk.StringVar(value='')
         self._timestamp = tk.StringVar(value='--:-- --')
+        self._key_info = tk.StringVar(value='')
 
         # Colors
         self.background_color = '#F0F0F0'
@@ -44,10 +58,32 @@ class KeyMonitorBanner:
         # Build the UI
         self._build_UI()
 
+        # The last values shown, and how to show a new value for each
+        self._rendered = {
+            'filename': '',
+            'timestamp': self._timestamp.get(),
+            'border': self.background_color,
+            'info': '',
+        }
+        self._renderers = {
+            'filename': self._key_filename.set,
+            'timestamp': self._timestamp.set,
+            'border': lambda color: self.outer_frame.configure(background=color),
+            'info': self._key_info.set,
+        }
+
         # Load settings
         self._primary_key = Path('')
+        self._primary_stem = ''
         self._load_primary_key()
 
+        # Key library, indexed in the background
+        self._key_index = None
+        self._load_key_index()
+
+        # Watch for the profiler signal file
+        self._poll_profiler()
+
 
     def show(self):
         """
@@ -59,7 +95,7 @@ class KeyMonitorBanner:
 
         try:
             if self._sibling_hwnd != 0:
-                win32gui.SetForegroundWindow(self._sibling_hwnd)
+                self.desktop.set_foreground_window(self._sibling_hwnd)
 
         except:
             pass
@@ -84,6 +120,18 @@ class KeyMonitorBanner:
         self.root.after(0, lambda: self._update_window_handle(window_handle))
 
 
+    def focus(self):
+        """Bring the window to the front."""
+
+        self.root.after(0, self._focus)
+
+
+    def reload_settings(self):
+        """Load the settings files again and refresh the display."""
+
+        self.root.after(0, self._reload_settings)
+
+
     def set_filename(self, filename: str):
         """
         Display the key filename provided by the user.
@@ -95,6 +143,7 @@ class KeyMonitorBanner:
         self.root.after(0, lambda: self._set_filename(filename))
 
 
+    @PROFILER.timed
     def _set_filename(self, filename):
         """
         Display the key filename provided by the user (Private).
@@ -103,39 +152,104 @@ class KeyMonitorBanner:
             filename (str): The name of the key file.
         """
 
-        file = Path(filename)
+        name = os.path.basename(filename)
+
+        self._render(
+            filename=name,
+            timestamp=datetime.now().strftime('%I:%M %p'),
+            border=self._border_color(name),
+            info=self._key_info_text(name)
+        )
+
+
+    def _render(self, **view):
+        """
+        Update the widgets for the fields of the view model that changed.
+
+        The last rendered value of each field is kept, so repeating an
+        update costs no Tk calls at all.
+
+        Args:
+            **view: New values for any of the fields 'filename', 'timestamp',
+                    'border' and 'info'.
+        """
+
+        for field, value in view.items():
+            if self._rendered.get(field) != value:
+                self._rendered[field] = value
+                self._renderers[field](value)
+
+
+    def _show_key_info(self):
+        """Show what the key library knows about the displayed key file."""
+
+        self._render(info=self._key_info_text(self._rendered['filename']))
+
+
+    def _key_info_text(self, name):
+        """
+        Describe what the key library knows about a key file.
+
+        Args:
+            name (str): The name of the key file.
+
+        Returns:
+            str - the text for the info label.
+        """
+
+        if not self._key_index or not name:
+            return ''
+
+        entries = self._key_index.lookup(name)
+
+        if not entries and not self._key_index.scanned:
+            return 'Indexing key library...'
+
+        if not entries:
+            return 'Not in key library'
 
-        self._key_filename.set(file.name)
-        self._timestamp.set(datetime.now().strftime('%I:%M %p'))
+        if self._key_index.is_collision(name):
+            return f'Warning: {len(entries)} different files named {name}'
 
-        self._set_border_color(file)
+        entry = entries[0]
+        status = 'Approved' if entry.approved else 'Unapproved'
+        return f'{status}  |  {entry.size:,} bytes  |  SHA-256 {entry.digest[:12]}'
 
 
-    def _set_border_color(self, file):
+    def _set_border_color(self):
+        """Set the border color for the displayed key file."""
+
+        self._render(border=self._border_color(self._rendered['filename']))
+
+
+    def _border_color(self, name):
         """
-        Set the border color based on the filename.
+        Choose the border color based on the filename.
 
         Args:
-            file (str, Path): The name of the key file.
+            name (str): The name of the key file.
+
+        Returns:
+            str - the color.
         """
 
-        if isinstance(file, str):
-            file = Path(file)
+        stem = os.path.splitext(name)[0].lower()
 
-        if not file.stem or not self._primary_key.stem:
-            self.outer_frame.configure(background=self.background_color)
+        if not stem or not self._primary_stem:
+            return self.background_color
 
-        elif file.stem.lower() == self._primary_key.stem.lower():
-            self.outer_frame.configure(background=self.primary_color)
+        elif stem == self._primary_stem:
+            return self.primary_color
 
         else:
-            self.outer_frame.configure(background=self.secondary_color)
+            return self.secondary_color
 
 
+    @PROFILER.timed
     def _move_to_sibling(self):
         """Set the window position above the sibling window."""
 
-        left, top, right, bottom = win32gui.GetWindowRect(self._sibling_hwnd)
+        left, top, right, bottom = self.desktop.get_window_rect(self._sibling_hwnd)
 
         if left   < 0 \
         or top    < 0 \
@@ -147,13 +261,10 @@ class KeyMonitorBanner:
         new_top = max(top - height, 0)
 
         self.root.update_idletasks()
-        hwnd = win32gui.FindWindow(None, 'Key File Monitor')
+        hwnd = self.desktop.find_window(None, 'Key File Monitor')
 
         if hwnd != 0:
-            win32gui.SetWindowPos(
-                hwnd, win32con.HWND_TOP, left, new_top, right - left, height,
-                win32con.SWP_SHOWWINDOW
-            )
+            self.desktop.set_window_pos(hwnd, left, new_top, right - left, height)
 
 
     def _update_window_handle(self, hwnd: int):
@@ -171,6 +282,23 @@ class KeyMonitorBanner:
             self.root.lift()
 
 
+    def _focus(self):
+        """Bring the window to the front (Private)."""
+
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+
+
+    def _reload_settings(self):
+        """Load the settings files again and refresh the display (Private)."""
+
+        self._load_primary_key()
+        self._set_border_color()
+        self._load_key_index()
+        self._show_key_info()
+
+
     def _build_UI(self):
         """Initialize the UI widgets for the window."""
 
@@ -202,8 +330,10 @@ class KeyMonitorBanner:
         # These hold the labels side by side in their own rows
         file_row = tk.Frame(fileinfo, background=self.background_color)
         time_row = tk.Frame(fileinfo, background=self.background_color)
+        info_row = tk.Frame(fileinfo, background=self.background_color)
         file_row.pack(fill='x', expand=True)
         time_row.pack(fill='x', expand=True)
+        info_row.pack(fill='x', expand=True)
 
         # Filename labels
         label = tk.Label(file_row, text='Key File: ', font=("Arial", 14))
@@ -225,6 +355,14 @@ class KeyMonitorBanner:
         label2.pack(side='left')
         timestamp.pack(side='left')
 
+        # Key library info label
+        info = tk.Label(
+            info_row,
+            textvariable=self._key_info,
+            font=("Arial", 10)
+        )
+        info.pack(side='left')
+
 
     def _handle_open_settings(self):
         """Handle the settings dialog when the settings button is clicked."""
@@ -233,8 +371,16 @@ class KeyMonitorBanner:
 
         if dlg.primary_key_value:
             self._primary_key = dlg.primary_key_value
+            self._primary_stem = self._primary_key.stem.lower()
             self._save_primary_key()
-            self._set_border_color(self._key_filename.get())
+            self._set_border_color()
+
+
+    def _poll_profiler(self):
+        """Check the profiler signal file once a second."""
+
+        PROFILER.poll_signal_file()
+        self.root.after(1000, self._poll_profiler)
 
 
     def _save_primary_key(self):
@@ -253,6 +399,72 @@ class KeyMonitorBanner:
         if path.exists():
             value = path.read_text(encoding="utf-8")
             self._primary_key = Path(value)
+            self._primary_stem = self._primary_key.stem.lower()
+
+
+    def _load_key_index(self):
+        """
+        Start indexing the key directories listed in an AppData file.
+
+        The file lists one directory per line. Approved key files are listed
+        by their SHA-256 digest, one per line, in a second file.
+        """
+
+        data_dir = Path(appdirs.user_data_dir('KeyFileMonitor'))
+        dirs_path = data_dir / "key_dirs.txt"
+        approved_path = data_dir / "approved.txt"
+
+        self._key_index = None
+
+        if not dirs_path.exists():
+            return
+
+        # Directory names may contain spaces, so split on lines only
+        directories = self._read_lines(dirs_path)
+        approved = []
+
+        if approved_path.exists():
+            approved = self._read_lines(approved_path)
+
+        self._key_index = KeyIndexer(
+            directories, data_dir / "key_index.json", approved
+        )
+
+        threading.Thread(
+            target=self._index_keys,
+            args=(self._key_index,),
+            daemon=True
+        ).start()
+
+
+    def _read_lines(self, path):
+        """Read the non-blank lines of a settings file."""
+
+        lines = path.read_text(encoding="utf-8").splitlines()
+        return [line.strip() for line in lines if line.strip()]
+
+
+    def _index_keys(self, key_index):
+        """
+        Load and rescan the key index (runs in a background thread).
+
+        Args:
+            key_index (KeyIndexer): The index to build. Reloading the settings
+                                    replaces self._key_index, so the thread
+                                    keeps working on the one it was given.
+        """
+
+        key_index.load()
+        self.root.after(0, self._show_key_info)
+
+        stats = key_index.scan()
+        key_index.save()
+        self.root.after(0, self._show_key_info)
+
+        print(
+            f"Key library: {stats['files']} files, {stats['hashed']} hashed, "
+            f"{stats['removed']} removed in {stats['seconds']:.2f} s"
+        )
 
 
 
@@ -290,6 +502,11 @@ class SettingsDialog:
         self.top.transient(parent)
         self.top.grab_set()
 
+        # Hidden option to switch the profiler on and off
+        self._title = title
+        self.top.bind("<Control-Shift-P>", lambda event: self._toggle_profiler())
+        self._show_profiler_state()
+
         # Build UI
         self._build_ui(default)
 
@@ -325,6 +542,23 @@ class SettingsDialog:
         tk.Button(button_frame, text="Cancel", width=10, command=self._on_cancel).pack(side=tk.LEFT, padx=(5, 0))
 
 
+    def _toggle_profiler(self):
+        """Switch the profiler on or off."""
+
+        PROFILER.toggle()
+        self._show_profiler_state()
+
+
+    def _show_profiler_state(self):
+        """Show in the title bar whether the profiler is running."""
+
+        if PROFILER.running:
+            self.top.title(f'{self._title} (profiling: {PROFILER.mode})')
+
+        else:
+            self.top.title(self._title)
+
+
     def _browse_file(self):
         """Trigger the Windows "Open" dialog."""
 
@@ -357,6 +591,17 @@ class SettingsDialog:
 class Tooltip:
     """A tooltip widget definition."""
 
+    class Pool:
+        """Holds the tooltip window shared by every Tooltip under one Tk root."""
+
+        def __init__(self, window, label):
+            """Contruct a Pool."""
+
+            self.window = window
+            self.label = label
+            self.owner = None
+
+
     def __init__(self, parent, text, delay=500):
         """
         Initialize a Tooltip.
@@ -405,11 +650,61 @@ class Tooltip:
         x = self.widget.winfo_rootx() + 20
         y = self.widget.winfo_rooty() + self.widget.winfo_height() + 5
 
-        self.tipwindow = tw = tk.Toplevel(self.widget)
+        pool = self._pool()
+
+        # Take the window over, so the previous tooltip cannot hide it
+        if pool.owner is not None and pool.owner is not self:
+            pool.owner.tipwindow = None
+
+        pool.owner = self
+
+        if pool.label.cget('text') != self.text:
+            pool.label.configure(text=self.text)
+
+        tw = pool.window
+        tw.wm_geometry(f"+{x}+{y}")
+        tw.deiconify()
+        tw.lift()
+
+        self.tipwindow = tw
+
+
+    def hide(self):
+        """Hide the tooltip."""
+
+        if self.tipwindow:
+            self.tipwindow.withdraw()
+            self.tipwindow = None
+
+            pool = getattr(self.widget._root(), '_tooltip_pool', None)
+
+            if pool and pool.owner is self:
+                pool.owner = None
+
+
+    def _pool(self):
+        """
+        Return the hidden tooltip window shared by every tooltip.
+
+        The window belongs to the Tk root rather than to a dialog, so it is
+        created once and then moved and relabelled for each tooltip. It is
+        kept on the root itself, and goes away with it.
+
+        Returns:
+            Tooltip.Pool - the Toplevel, its Label and the current owner.
+        """
+
+        root = self.widget._root()
+        pool = getattr(root, '_tooltip_pool', None)
+
+        if pool and pool.window.winfo_exists():
+            return pool
+
+        tw = tk.Toplevel(root)
+        tw.withdraw()
 
         # No border or titlebar
         tw.wm_overrideredirect(True)
-        tw.wm_geometry(f"+{x}+{y}")
 
         label = tk.Label(
             tw,
@@ -421,11 +716,5 @@ class Tooltip:
         )
         label.pack(ipadx=5, ipady=2)
 
-
-    def hide(self):
-        """Hide the tooltip."""
-
-        if self.tipwindow:
-            self.tipwindow.destroy()
-            self.tipwindow = None
-
+        root._tooltip_pool = self.Pool(tw, label)
+        return root._tooltip_pool
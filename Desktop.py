@@ -0,0 +1,227 @@
+"""
+Define the Win32Desktop class.
+
+This class wraps the handful of Win32 calls the WindowWatcher needs to find
+windows, read their text and receive WinEvents. Keeping them behind one object
+allows the watcher to be driven by a simulated desktop (see Simulator.py) when
+testing away from Windows.
+"""
+
+import ctypes
+import ctypes.wintypes
+import pythoncom
+import win32gui
+import win32con
+import win32api
+import win32process
+from types import FunctionType
+
+
+
+class Win32Desktop:
+    """Access to the real Windows desktop."""
+
+    OBJID_WINDOW = win32con.OBJID_WINDOW
+    GA_ROOT = 2
+
+
+    def __init__(self):
+        """Initialize the desktop wrapper."""
+
+        # Define the callback type used by the SetWinEventHook API
+        self.WinEventProcType = ctypes.WINFUNCTYPE(
+            None,
+            ctypes.wintypes.HANDLE,
+            ctypes.wintypes.DWORD,
+            ctypes.wintypes.HWND,
+            ctypes.wintypes.LONG,
+            ctypes.wintypes.LONG,
+            ctypes.wintypes.DWORD,
+            ctypes.wintypes.DWORD
+        )
+
+        # The ctypes callbacks must outlive their hooks
+        self._procs = {}
+
+
+    def find_window(self, class_name: str, title: str) -> int:
+        """
+        Find a top level window.
+
+        Args:
+            class_name (str): The window class name, or None for any class.
+            title (str): The window title, or None for any title.
+
+        Returns:
+            int - handle to the window, or 0 if not found.
+        """
+
+        return win32gui.FindWindow(class_name, title)
+
+
+    def enum_windows(self) -> list:
+        """
+        List every top level window in one pass.
+
+        Returns:
+            list - (hwnd, title, class name, process id) tuples in Z order.
+        """
+
+        windows = []
+
+        def collect(hwnd, _):
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+            windows.append(
+                (hwnd, win32gui.GetWindowText(hwnd), win32gui.GetClassName(hwnd), pid)
+            )
+            return True
+
+        win32gui.EnumWindows(collect, None)
+        return windows
+
+
+    def find_child(self, parent: int, class_name: str) -> int:
+        """
+        Find the first direct child of a window with the given class.
+
+        Returns:
+            int - handle to the child, or 0 if not found.
+        """
+
+        return win32gui.FindWindowEx(parent, None, class_name, None)
+
+
+    def find_children(self, parent: int, class_name: str) -> list:
+        """
+        Find every descendant of a window with the given class.
+
+        Returns:
+            list - window handles in Z order.
+        """
+
+        children = []
+
+        def collect(hwnd, _):
+            if win32gui.GetClassName(hwnd) == class_name:
+                children.append(hwnd)
+            return True
+
+        try:
+            win32gui.EnumChildWindows(parent, collect, None)
+
+        except win32gui.error:
+            pass
+
+        return children
+
+
+    def get_root(self, hwnd: int) -> int:
+        """Return the top level window that owns a window."""
+
+        return ctypes.windll.user32.GetAncestor(hwnd, self.GA_ROOT)
+
+
+    def is_window(self, hwnd: int) -> bool:
+        """Return True if the handle refers to an existing window."""
+
+        return bool(win32gui.IsWindow(hwnd))
+
+
+    def get_title(self, hwnd: int) -> str:
+        """Return the title of a top level window."""
+
+        return win32gui.GetWindowText(hwnd)
+
+
+    def get_text(self, hwnd: int) -> str:
+        """Return the text of a control, which may belong to another process."""
+
+        buffer = ctypes.create_unicode_buffer(512)
+        win32gui.SendMessage(hwnd, win32con.WM_GETTEXT, 512, buffer)
+        return buffer.value
+
+
+    def get_process_id(self, hwnd: int) -> int:
+        """Return the id of the process that owns a window."""
+
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        return pid
+
+
+    def set_hook(self, event_min: int, event_max: int, proc: FunctionType, pid=0) -> int:
+        """
+        Install an out-of-context WinEvent hook on the calling thread.
+
+        Args:
+            event_min (int): The lowest event constant to receive.
+            event_max (int): The highest event constant to receive.
+            proc (FunctionType): Called with the WinEventProc arguments.
+            pid (int): Only receive events from this process
+                       (default 0, every process).
+
+        Returns:
+            int - the hook handle.
+        """
+
+        callback = self.WinEventProcType(proc)
+
+        hook = ctypes.windll.user32.SetWinEventHook(
+            event_min,
+            event_max,
+            0,
+            callback,
+            pid,
+            0,
+            0  # WINEVENT_OUTOFCONTEXT
+        )
+
+        if hook:
+            self._procs[hook] = callback
+
+        return hook
+
+
+    def unhook(self, hook: int):
+        """Remove a hook installed with set_hook()."""
+
+        ctypes.windll.user32.UnhookWinEvent(hook)
+        self._procs.pop(hook, None)
+
+
+    def get_window_rect(self, hwnd: int) -> tuple:
+        """Return the (left, top, right, bottom) screen position of a window."""
+
+        return win32gui.GetWindowRect(hwnd)
+
+
+    def set_window_pos(self, hwnd: int, left: int, top: int, width: int, height: int):
+        """Move and resize a window, bringing it to the top and showing it."""
+
+        win32gui.SetWindowPos(
+            hwnd, win32con.HWND_TOP, left, top, width, height,
+            win32con.SWP_SHOWWINDOW
+        )
+
+
+    def set_foreground_window(self, hwnd: int):
+        """Bring a window to the foreground."""
+
+        win32gui.SetForegroundWindow(hwnd)
+
+
+    def current_thread_id(self) -> int:
+        """Return the id of the calling thread."""
+
+        return win32api.GetCurrentThreadId()
+
+
+    def pump_messages(self):
+        """Run the message loop of the calling thread until WM_QUIT."""
+
+        pythoncom.PumpMessages()
+
+
+    def post_quit(self, thread_id: int):
+        """Ask a thread's message loop to exit."""
+
+        win32api.PostThreadMessage(thread_id, win32con.WM_QUIT, 0, 0)
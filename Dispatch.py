@@ -0,0 +1,380 @@
+"""
+Define the CallbackExecutor and SynchronousExecutor classes.
+
+The WindowWatcher hands its user callbacks to an executor instead of calling
+them from the hook thread, so that a slow callback does not hold up the events
+behind it. Callbacks for the same target always run in the order they were
+submitted.
+
+Callbacks that report a window being created or destroyed are always queued.
+Only callbacks submitted with coalesce=True, such as one per keystroke in the
+"Open" dialog, may be merged when the workers fall behind, and the latest
+arguments always reach the callback.
+"""
+
+import queue
+import threading
+import traceback
+from time import perf_counter, monotonic
+from types import FunctionType
+
+
+
+class CallbackStats:
+    """Counts and timings shared by both executors."""
+
+    def __init__(self):
+        """Initialize the counters."""
+
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+
+    def record(self, latency: float, failed: bool):
+        """Record a finished callback and the seconds since it was submitted."""
+
+        with self._lock:
+            self.completed += 1
+            self.failed += failed
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+
+    def report(self) -> dict:
+        """
+        Summarize the counters.
+
+        Returns:
+            dict - submitted, completed, coalesced, rejected and failed
+                   counts, and the mean and max latency in milliseconds.
+        """
+
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'mean_latency_ms': self.total_latency * 1000 / self.completed if self.completed else 0.0,
+                'max_latency_ms': self.max_latency * 1000,
+            }
+
+
+
+class SynchronousExecutor:
+    """Runs each callback immediately on the submitting thread."""
+
+    def __init__(self):
+        """Initialize the executor."""
+
+        self.stats = CallbackStats()
+
+
+    def submit(self, target: str, callback: FunctionType, *args, coalesce=False) -> bool:
+        """
+        Run a callback now.
+
+        Args:
+            target (str): The name of the target the callback belongs to.
+            callback (FunctionType): The function to call.
+            *args: Arguments for the callback.
+            coalesce (bool): Ignored, nothing is ever waiting.
+
+        Returns:
+            bool - always True.
+        """
+
+        with self.stats._lock:
+            self.stats.submitted += 1
+
+        _run(self.stats, perf_counter(), callback, args)
+        return True
+
+
+    def start(self):
+        """Nothing to start."""
+
+        pass
+
+
+    def wait_idle(self):
+        """Callbacks have always finished by the time submit() returns."""
+
+        pass
+
+
+    def shutdown(self, timeout=None) -> bool:
+        """Nothing to stop."""
+
+        return True
+
+
+
+class CallbackExecutor:
+    """Runs callbacks on a bounded pool of worker threads."""
+
+    _STOP = object()
+
+
+    class Message:
+        """Holds a queued callback until a worker takes it."""
+
+        def __init__(self, submitted, callback, args, coalesce):
+            """Contruct a Message."""
+
+            self.submitted = submitted
+            self.callback = callback
+            self.args = args
+            self.coalesce = coalesce
+            self.taken = False
+
+
+    def __init__(self, workers=2, queue_limit=64, daemon=True):
+        """
+        Initialize the executor and start its workers.
+
+        Each target is assigned to one worker, which keeps that target's
+        callbacks in order.
+
+        Args:
+            workers (int): The number of worker threads (default 2).
+            queue_limit (int): How many callbacks may wait for each worker
+                               before coalesced ones are held back (default
+                               64). Other callbacks are always queued.
+            daemon (bool): Run the workers as daemon threads (default True).
+        """
+
+        self.stats = CallbackStats()
+        self.workers = workers
+        self.queue_limit = max(queue_limit, 1)
+        self.daemon = daemon
+
+        self._lock = threading.Lock()
+        self._queues = []
+        self._threads = []
+        self._targets = {}
+        self._running = False
+
+        # The most recent message submitted for each target
+        self._last = {}
+
+        # A coalesced message per target, held while its worker's queue is
+        # full and queued by the worker as soon as there is room
+        self._held = {}
+
+        self.start()
+
+
+    def start(self):
+        """
+        Start the workers, if they are not running already.
+
+        After shutdown() the executor may be started again. The new workers
+        get queues of their own, so a worker that did not stop in time
+        cannot take their callbacks.
+        """
+
+        with self._lock:
+            if self._running:
+                return
+
+            self._queues = [queue.Queue() for _ in range(self.workers)]
+            self._last.clear()
+            self._held.clear()
+
+            self._threads = [
+                threading.Thread(
+                    target=self._worker_main,
+                    args=(messages,),
+                    name=f'callback-worker-{number}',
+                    daemon=self.daemon
+                )
+                for number, messages in enumerate(self._queues)
+            ]
+
+            for thread in self._threads:
+                thread.start()
+
+            self._running = True
+
+
+    def submit(self, target: str, callback: FunctionType, *args, coalesce=False) -> bool:
+        """
+        Queue a callback behind the earlier ones for the same target.
+
+        Args:
+            target (str): The name of the target the callback belongs to.
+            callback (FunctionType): The function to call.
+            *args: Arguments for the callback.
+            coalesce (bool): Only the latest arguments matter (default False).
+                             If the same callback is still waiting at the end
+                             of the target's queue it is given these arguments
+                             instead of queueing another call. If the
+                             worker's queue is full the callback is held for
+                             the target and queued once there is room, and
+                             a different coalesced callback held for the
+                             target is dropped in its favour.
+
+        Returns:
+            bool - False if an earlier callback was dropped to make room, or
+                   if this one was dropped because the executor is shut down.
+        """
+
+        with self.stats._lock:
+            self.stats.submitted += 1
+
+        with self._lock:
+            if not self._running:
+                with self.stats._lock:
+                    self.stats.rejected += 1
+
+                print('Callback dropped, executor shut down:', target, callback.__name__)
+                return False
+
+            if target not in self._targets:
+                self._targets[target] = len(self._targets) % len(self._queues)
+
+            messages = self._queues[self._targets[target]]
+            message = self.Message(perf_counter(), callback, args, coalesce)
+
+            if not coalesce:
+                # Whatever is held for the target goes first, to keep the order
+                held = self._held.pop(target, None)
+
+                if held:
+                    messages.put(held)
+
+                self._last[target] = message
+                messages.put(message)
+                return True
+
+            last = self._last.get(target)
+
+            if last and last.coalesce and not last.taken and last.callback == callback:
+                last.args = args
+
+                with self.stats._lock:
+                    self.stats.coalesced += 1
+
+                return True
+
+            self._last[target] = message
+
+            if messages.qsize() < self.queue_limit:
+                messages.put(message)
+                return True
+
+            dropped = self._held.get(target)
+            self._held[target] = message
+
+        if dropped:
+            with self.stats._lock:
+                self.stats.rejected += 1
+
+            print('Callback dropped, queue full:', target, dropped.callback.__name__)
+            return False
+
+        return True
+
+
+    def wait_idle(self):
+        """Wait until every queued callback has finished."""
+
+        for messages in self._queues:
+            messages.join()
+
+
+    def shutdown(self, timeout=None) -> bool:
+        """
+        Let the workers finish their queued callbacks, then stop them.
+
+        Callbacks submitted afterwards are dropped until start() is called.
+
+        Args:
+            timeout (float): Seconds to wait for all the workers together
+                             (default None, wait forever).
+
+        Returns:
+            bool - True if every worker stopped in time.
+        """
+
+        deadline = None if timeout is None else monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(deadline - monotonic(), 0)
+
+        with self._lock:
+            self._running = False
+
+            for target, held in self._held.items():
+                self._queues[self._targets[target]].put(held)
+
+            self._held.clear()
+
+            for messages in self._queues:
+                messages.put(self._STOP)
+
+            threads = self._threads
+
+        for thread in threads:
+            thread.join(remaining())
+
+        return not any(thread.is_alive() for thread in threads)
+
+
+    def _worker_main(self, messages):
+        """Entry point of a worker thread."""
+
+        while True:
+            message = messages.get()
+
+            try:
+                if message is self._STOP:
+                    return
+
+                # Arguments can no longer be replaced once the message is taken
+                with self._lock:
+                    message.taken = True
+                    args = message.args
+                    self._queue_held(messages)
+
+                _run(self.stats, message.submitted, message.callback, args)
+
+            finally:
+                messages.task_done()
+
+
+    def _queue_held(self, messages):
+        """Queue the messages held for a worker's targets (the lock must be held)."""
+
+        for target in list(self._held):
+            if self._queues[self._targets[target]] is not messages:
+                continue
+
+            if messages.qsize() >= self.queue_limit:
+                break
+
+            messages.put(self._held.pop(target))
+
+
+
+def _run(stats, submitted, callback, args):
+    """Call a callback, recording its latency and reporting any exception."""
+
+    failed = False
+
+    try:
+        callback(*args)
+
+    except Exception:
+        failed = True
+        traceback.print_exc()
+
+    stats.record(perf_counter() - submitted, failed)
@@ -0,0 +1,237 @@
+"""
+Define the EventLog and HeadlessView classes.
+
+In headless mode the application runs without a banner, and without importing
+tkinter. HeadlessView stands in for the KeyMonitorBanner, and EventLog writes
+each change in the application state as one line of JSON, so the output can
+be piped into other tools.
+
+State changes are reported on whichever thread made them, often the hook
+thread. EventLog only queues the events there; they are written to the stream
+by the thread running HeadlessView.show(), so a slow reader never holds up
+the watcher.
+
+When the events go to stdout, everything else the application prints is sent
+to stderr instead, so stdout stays valid JSON lines.
+"""
+
+import json
+import queue
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from State import StateStore
+from Profiler import PROFILER
+
+
+
+def open_output(path: str):
+    """
+    Open the stream the events are written to.
+
+    Args:
+        path (str): A file to append to, or '-' for stdout. For stdout, the
+                    print() diagnostics of the rest of the application are
+                    redirected to stderr.
+
+    Returns:
+        TextIO - the stream, or None if there is no console for stdout.
+    """
+
+    if path != '-':
+        return open(path, 'a', encoding='utf-8', buffering=64 * 1024)
+
+    stream = sys.stdout
+
+    # The windowed build has no console to write to
+    if stream is None:
+        return None
+
+    if sys.stderr is not None:
+        sys.stdout = sys.stderr
+
+    return stream
+
+
+
+class EventLog:
+    """Writes application events as newline-delimited JSON."""
+
+    LOADER_ATTACHED = 'loader_attached'
+    LOADER_DETACHED = 'loader_detached'
+    DIALOG_OPENED = 'dialog_opened'
+    DIALOG_CLOSED = 'dialog_closed'
+    SELECTION_COMMITTED = 'selection_committed'
+
+
+    def __init__(self, stream, flush_interval=1.0):
+        """
+        Initialize an event log.
+
+        Args:
+            stream (TextIO): Where the events are written. Events are
+                             queued and only written by flush(), which
+                             HeadlessView calls every flush_interval and
+                             when it closes.
+            flush_interval (float): Seconds between flushes (default 1.0).
+        """
+
+        self.stream = stream
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._events = queue.SimpleQueue()
+
+
+    def watch(self, store: StateStore):
+        """
+        Log the current state, then every change to it.
+
+        Args:
+            store (StateStore): The application state to follow.
+        """
+
+        # The current state is replayed under the store's lock, so no change
+        # can be lost or logged ahead of it
+        store.subscribe(self._on_state_changed, replay=True)
+
+
+    def write(self, event: str, **fields):
+        """
+        Queue one event for the next flush.
+
+        Args:
+            event (str): The event name.
+            **fields: Extra values to include.
+        """
+
+        record = {'time': datetime.now().isoformat(timespec='milliseconds'), 'event': event}
+        record.update(fields)
+        self._events.put(json.dumps(record) + '\n')
+
+
+    def flush(self):
+        """Write the queued events to the stream and flush it."""
+
+        with self._lock:
+            lines = []
+
+            while True:
+                try:
+                    lines.append(self._events.get_nowait())
+
+                except queue.Empty:
+                    break
+
+            if lines:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+
+
+    def close(self):
+        """Write any queued events. The stream is left open."""
+
+        self.flush()
+
+
+    def _on_state_changed(self, diff, state):
+        """Turn state changes into events."""
+
+        if 'loader_hwnd' in diff:
+            old, new = diff['loader_hwnd']
+
+            if old:
+                self.write(self.LOADER_DETACHED, hwnd=old)
+
+            if new:
+                self.write(self.LOADER_ATTACHED, hwnd=new)
+
+        if 'dialog_hwnd' in diff:
+            old, new = diff['dialog_hwnd']
+
+            if old:
+                self.write(self.DIALOG_CLOSED, hwnd=old)
+
+            if new:
+                self.write(self.DIALOG_OPENED, hwnd=new)
+
+        if 'committed_time' in diff or 'committed_filename' in diff:
+            self._write_selection(state)
+
+
+    def _write_selection(self, state):
+        """Write a selection_committed event for the current selection."""
+
+        self.write(
+            self.SELECTION_COMMITTED,
+            filename=state.committed_filename,
+            name=Path(state.committed_filename).name
+        )
+
+
+
+class HeadlessView:
+    """Takes the place of the KeyMonitorBanner when there is no window."""
+
+    def __init__(self, log: EventLog):
+        """
+        Initialize the view.
+
+        Args:
+            log (EventLog): The log to write out while running.
+        """
+
+        self.log = log
+        self._closed = threading.Event()
+
+
+    def show(self):
+        """
+        Run until close() is called, or until Ctrl+C is pressed.
+
+        This method will not return until then, like KeyMonitorBanner.show.
+        The profiler signal file is checked on each flush, as the banner
+        would. Queued events are always written out before returning.
+        """
+
+        try:
+            while not self._closed.wait(self.log.flush_interval):
+                self.log.flush()
+                PROFILER.poll_signal_file()
+
+        except KeyboardInterrupt:
+            print('Interrupted')
+
+        finally:
+            self.log.close()
+
+
+    def close(self):
+        """Stop running."""
+
+        self._closed.set()
+
+
+    def attach_to_window(self, window_handle: int):
+        """Nothing to attach, the loader is logged from the state."""
+
+        pass
+
+
+    def set_filename(self, filename: str):
+        """Nothing to display, the selection is logged from the state."""
+
+        pass
+
+
+    def focus(self):
+        """Nothing to bring to the front."""
+
+        pass
+
+
+    def reload_settings(self):
+        """There are no headless settings."""
+
+        pass
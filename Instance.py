@@ -0,0 +1,244 @@
+"""
+Define the SingleInstance class.
+
+Only one monitor should run at a time, since each one installs its own global
+hooks and banner. The first instance holds an exclusive lock on a file in the
+app data directory and listens on a local socket. A later launch fails to take
+the lock, sends its request (such as "focus") over the socket and exits.
+
+Only the standard library is used here, so the check can be made before Tk
+or the Win32 modules are imported. The lock is released by the OS when the
+process exits, even if it crashes.
+"""
+
+import os
+import socket
+import threading
+import traceback
+from pathlib import Path
+from time import sleep, monotonic
+from types import FunctionType
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+
+class SingleInstance:
+    """Makes sure only one monitor runs, and passes requests to it."""
+
+    LOCK_FILE = 'instance.lock'
+    SOCKET_FILE = 'instance.sock'
+    PORT_FILE = 'instance.port'
+
+    FOCUS = 'focus'
+    RELOAD = 'reload'
+
+
+    def __init__(self, data_dir):
+        """
+        Initialize the instance check.
+
+        Args:
+            data_dir (Path): The directory holding the lock and socket files.
+        """
+
+        self.data_dir = Path(data_dir)
+
+        self._lock_file = None
+        self._server = None
+        self._handler = None
+        self._pending = []
+        self._mutex = threading.Lock()
+
+
+    def acquire(self) -> bool:
+        """
+        Try to become the running instance.
+
+        On success, start listening for requests from later launches.
+
+        Returns:
+            bool - True if no other instance holds the lock.
+        """
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.data_dir / self.LOCK_FILE, 'a+')
+
+        try:
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        self._listen()
+        return True
+
+
+    def send(self, command: str, timeout=2.0) -> bool:
+        """
+        Pass a request to the running instance.
+
+        Args:
+            command (str): The request, e.g. FOCUS or RELOAD.
+            timeout (float): Seconds to keep trying while the running instance
+                             starts listening (default 2.0).
+
+        Returns:
+            bool - True if the running instance acknowledged the request.
+        """
+
+        deadline = monotonic() + timeout
+
+        while True:
+            try:
+                with self._connect(max(deadline - monotonic(), 0.01)) as connection:
+                    connection.sendall(command.encode('utf-8') + b'\n')
+                    return connection.recv(16).startswith(b'ok')
+
+            except (OSError, ValueError):
+                if monotonic() > deadline:
+                    return False
+
+                sleep(0.02)
+
+
+    def set_handler(self, handler: FunctionType):
+        """
+        Set the function that handles requests from later launches.
+
+        Requests received before this is called are handled now.
+
+        Args:
+            handler (FunctionType): Called with each request string, on the
+                                    listener thread.
+        """
+
+        with self._mutex:
+            self._handler = handler
+            pending, self._pending = self._pending, []
+
+        for command in pending:
+            handler(command)
+
+
+    def release(self):
+        """Stop listening and give up the lock."""
+
+        if self._server:
+            self._server.close()
+            self._server = None
+
+            if self._use_unix_socket():
+                try:
+                    os.unlink(self.data_dir / self.SOCKET_FILE)
+
+                except OSError:
+                    pass
+
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+    def _use_unix_socket(self):
+        """Unix sockets where available, otherwise TCP on the loopback address."""
+
+        return hasattr(socket, 'AF_UNIX') and os.name != 'nt'
+
+
+    def _listen(self):
+        """Open the request socket and start the listener thread."""
+
+        if self._use_unix_socket():
+            path = str(self.data_dir / self.SOCKET_FILE)
+
+            # Left behind by an instance that crashed, we hold the lock now
+            if os.path.exists(path):
+                os.unlink(path)
+
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+
+        else:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind(('127.0.0.1', 0))
+            (self.data_dir / self.PORT_FILE).write_text(
+                str(server.getsockname()[1]), encoding='utf-8'
+            )
+
+        server.listen()
+        self._server = server
+
+        threading.Thread(
+            target=self._listener_main,
+            args=(server,),
+            name='instance-listener',
+            daemon=True
+        ).start()
+
+
+    def _connect(self, timeout):
+        """Connect to the running instance's request socket."""
+
+        if self._use_unix_socket():
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = str(self.data_dir / self.SOCKET_FILE)
+
+        else:
+            connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            port = (self.data_dir / self.PORT_FILE).read_text(encoding='utf-8')
+            address = ('127.0.0.1', int(port))
+
+        connection.settimeout(timeout)
+
+        try:
+            connection.connect(address)
+
+        except OSError:
+            connection.close()
+            raise
+
+        return connection
+
+
+    def _listener_main(self, server):
+        """Entry point of the listener thread."""
+
+        while True:
+            try:
+                connection, _ = server.accept()
+
+            except OSError:
+                return
+
+            with connection:
+                try:
+                    connection.settimeout(1.0)
+                    command = connection.makefile('r', encoding='utf-8').readline().strip()
+                    connection.sendall(b'ok\n')
+
+                except OSError:
+                    continue
+
+            with self._mutex:
+                handler = self._handler
+
+                if handler is None:
+                    self._pending.append(command)
+
+            if handler:
+                try:
+                    handler(command)
+
+                except Exception:
+                    traceback.print_exc()
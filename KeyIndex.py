@@ -0,0 +1,243 @@
+"""
+Define the KeyIndexer class.
+
+The indexer scans the configured key directories and records every key file
+it finds with its size, modification time and SHA-256 digest. The index is
+saved between runs, and a rescan only hashes files whose size or modification
+time changed. Lookups by filename are a single dict access, so the banner can
+show what it knows about a selected file immediately.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+
+
+class KeyEntry:
+    """Holds info about an indexed key file."""
+
+    def __init__(self, name: str, path: str, size: int, mtime: int, digest: str, approved=False):
+        """
+        Contruct a KeyEntry.
+
+        Args:
+            name (str): The filename.
+            path (str): The full path of the file.
+            size (int): The file size in bytes.
+            mtime (int): The modification time in nanoseconds.
+            digest (str): The SHA-256 digest of the contents, in hex.
+            approved (bool): True if the digest is on the approved list
+                             (default False).
+        """
+
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.digest = digest
+        self.approved = approved
+
+
+    def to_dict(self) -> dict:
+        """Return the fields that are saved in the index file."""
+
+        return {
+            'name': self.name,
+            'path': self.path,
+            'size': self.size,
+            'mtime': self.mtime,
+            'digest': self.digest,
+        }
+
+
+
+class KeyIndexer:
+    """Indexes the key files found in a set of directories."""
+
+    CHUNK_SIZE = 1024 * 1024
+
+
+    def __init__(self, directories: list, index_path: Path, approved=(), workers=4):
+        """
+        Initialize a key indexer.
+
+        Args:
+            directories (list): The directories to scan, including their
+                                subdirectories.
+            index_path (Path): Where the index is saved between runs.
+            approved (iterable): SHA-256 digests of the approved key files
+                                 (default none).
+            workers (int): The number of threads used for hashing (default 4).
+        """
+
+        self.directories = [Path(directory) for directory in directories]
+        self.index_path = Path(index_path)
+        self.approved = {digest.lower() for digest in approved}
+        self.workers = workers
+
+        # Replaced as a whole after each scan, so lookups never need a lock
+        self._by_path = {}
+        self._by_name = {}
+
+        # Until the first scan is published, a missing file may just not be
+        # indexed yet
+        self.scanned = False
+
+        self._scan_lock = threading.Lock()
+
+
+    def load(self):
+        """Load the index saved by a previous run, if any."""
+
+        try:
+            records = json.loads(self.index_path.read_text(encoding='utf-8'))
+            entries = [KeyEntry(**record) for record in records]
+            entries = {entry.path: entry for entry in entries}
+
+        except FileNotFoundError:
+            return
+
+        except (OSError, ValueError, TypeError) as error:
+            # The next scan hashes everything again
+            print('Key index not loaded:', error)
+            return
+
+        self._publish(entries)
+
+
+    def save(self):
+        """Save the index so the next run can rescan incrementally."""
+
+        records = [entry.to_dict() for entry in self._by_path.values()]
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(records), encoding='utf-8')
+        os.replace(temp_path, self.index_path)
+
+
+    def scan(self) -> dict:
+        """
+        Rescan the key directories.
+
+        Files whose size and modification time match the existing index keep
+        their digest. Everything else is hashed on the thread pool.
+
+        Returns:
+            dict - the number of files found, hashed and removed, and the
+                   seconds taken.
+        """
+
+        with self._scan_lock:
+            start = perf_counter()
+            previous = self._by_path
+            entries = {}
+            stale = []
+
+            for path, stat in self._walk():
+                entry = previous.get(path)
+
+                if entry and entry.size == stat.st_size and entry.mtime == stat.st_mtime_ns:
+                    entries[path] = entry
+
+                else:
+                    stale.append((path, stat))
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for path, entry in zip(
+                    [path for path, _ in stale],
+                    pool.map(self._hash_entry, stale)
+                ):
+                    if entry:
+                        entries[path] = entry
+
+            self._publish(entries)
+            self.scanned = True
+
+            return {
+                'files': len(entries),
+                'hashed': len(stale),
+                'removed': len(set(previous) - set(entries)),
+                'seconds': perf_counter() - start,
+            }
+
+
+    def lookup(self, filename: str) -> list:
+        """
+        Find the indexed files with a given name.
+
+        Args:
+            filename (str): A filename or path, only the name is used.
+
+        Returns:
+            list - the matching KeyEntry objects, possibly empty.
+        """
+
+        return self._by_name.get(Path(filename).name.lower(), [])
+
+
+    def is_collision(self, filename: str) -> bool:
+        """Return True if different files share the given name."""
+
+        return len({entry.digest for entry in self.lookup(filename)}) > 1
+
+
+    def _walk(self):
+        """Yield the path and stat result of every file in the key directories."""
+
+        pending = [str(directory) for directory in self.directories]
+
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as items:
+                    for item in items:
+                        # One unreadable entry should not hide the rest
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                pending.append(item.path)
+
+                            elif item.is_file():
+                                yield item.path, item.stat()
+
+                        except OSError:
+                            continue
+
+            except OSError:
+                continue
+
+
+    def _hash_entry(self, path_stat):
+        """Hash one file and build its entry (runs on the thread pool)."""
+
+        path, stat = path_stat
+        digest = hashlib.sha256()
+
+        try:
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(self.CHUNK_SIZE), b''):
+                    digest.update(chunk)
+
+        except OSError:
+            return None
+
+        return KeyEntry(
+            Path(path).name, path, stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+        )
+
+
+    def _publish(self, entries):
+        """Swap in a new set of entries and rebuild the name index."""
+
+        by_name = {}
+
+        for entry in entries.values():
+            entry.approved = entry.digest in self.approved
+            by_name.setdefault(entry.name.lower(), []).append(entry)
+
+        self._by_path = entries
+        self._by_name = by_name
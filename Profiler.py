@@ -0,0 +1,320 @@
+"""
+Define the Profiler class.
+
+The profiler can be switched on while the application is running, which
+matters for the windowed build where no debugger or console is available. It
+has two modes:
+
+    timers  - counts calls and time spent in the functions decorated with
+              PROFILER.timed(), at the cost of one flag check when off.
+    sampler - a background thread samples every thread's stack at a fixed
+              interval and aggregates them as collapsed stacks, ready for
+              flame graph tools.
+
+Profiling is switched on by the KFM_PROFILE environment variable, by creating
+the signal file profile.on in the app data directory (its contents may name
+the mode), or by pressing Ctrl+Shift+P in the settings dialog. Stopping writes
+the aggregated results to the profiles folder in the app data directory.
+"""
+
+import functools
+import os
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter, sleep
+from types import FunctionType
+import appdirs
+
+
+
+class Profiler:
+    """Collects timings or stack samples while switched on."""
+
+    TIMERS = 'timers'
+    SAMPLER = 'sampler'
+
+    ENV_VAR = 'KFM_PROFILE'
+    SIGNAL_FILE = 'profile.on'
+
+
+    def __init__(self, data_dir=None, interval=0.005):
+        """
+        Initialize a profiler, switched off.
+
+        Args:
+            data_dir (Path): Where the signal file is looked for and the
+                             profiles folder is created
+                             (default the app data directory).
+            interval (float): Seconds between stack samples (default 0.005).
+        """
+
+        if data_dir is None:
+            data_dir = appdirs.user_data_dir('KeyFileMonitor')
+
+        self.data_dir = Path(data_dir)
+        self.interval = interval
+
+        self.mode = None
+        self._started = None
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._stacks = {}
+        self._samples = 0
+        self._sampler = None
+
+        # The last unknown mode warned about, so polling does not repeat it
+        self._unknown_mode = None
+
+
+    @property
+    def running(self) -> bool:
+        """True while the profiler is switched on."""
+
+        return self.mode is not None
+
+
+    def timed(self, function: FunctionType) -> FunctionType:
+        """
+        Decorate a function so its calls are timed in TIMERS mode.
+
+        Args:
+            function (FunctionType): The function to time.
+
+        Returns:
+            FunctionType - the wrapped function.
+        """
+
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if self.mode != self.TIMERS:
+                return function(*args, **kwargs)
+
+            start = perf_counter()
+
+            try:
+                return function(*args, **kwargs)
+
+            finally:
+                self._record(name, perf_counter() - start)
+
+        return wrapper
+
+
+    def start(self, mode=TIMERS):
+        """
+        Switch the profiler on.
+
+        Args:
+            mode (str): TIMERS or SAMPLER (default TIMERS).
+        """
+
+        if mode not in (self.TIMERS, self.SAMPLER):
+            raise ValueError(f'Unknown profiler mode: {mode}')
+
+        if self.running:
+            return
+
+        with self._lock:
+            self._timings = {}
+            self._stacks = {}
+            self._samples = 0
+
+        self._started = datetime.now()
+        self.mode = mode
+
+        if mode == self.SAMPLER:
+            self._sampler = threading.Thread(
+                target=self._sampler_main,
+                name='profiler-sampler',
+                daemon=True
+            )
+            self._sampler.start()
+
+        print('Profiler started:', mode)
+
+
+    def stop(self) -> Path:
+        """
+        Switch the profiler off and save the results.
+
+        Returns:
+            Path - the stats file written, or None if it was not running.
+        """
+
+        if not self.running:
+            return None
+
+        mode = self.mode
+        self.mode = None
+
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+
+        path = self._dump(mode)
+        print('Profiler stopped, results saved to', path)
+        return path
+
+
+    def toggle(self, mode=TIMERS):
+        """Switch the profiler on, or off if it is already on."""
+
+        if self.running:
+            self.stop()
+
+        else:
+            self.start(mode)
+
+
+    def start_from_environment(self):
+        """Switch on if the KFM_PROFILE environment variable names a mode."""
+
+        mode = self._parse_mode(os.environ.get(self.ENV_VAR, ''), self.ENV_VAR)
+
+        if mode:
+            self.start(mode)
+
+
+    def poll_signal_file(self):
+        """Switch on while the signal file exists and off once it is removed."""
+
+        path = self.data_dir / self.SIGNAL_FILE
+
+        if path.exists():
+            if not self.running:
+                try:
+                    mode = path.read_text(encoding='utf-8')
+
+                except OSError:
+                    mode = ''
+
+                # An empty signal file just means the default mode
+                mode = self._parse_mode(mode or self.TIMERS, path.name)
+
+                if mode:
+                    self.start(mode)
+
+        elif self.running:
+            self.stop()
+
+
+    def _parse_mode(self, value, source):
+        """
+        Check a mode name given by the environment or the signal file.
+
+        Args:
+            value (str): The text to check.
+            source (str): Where it came from, for the warning.
+
+        Returns:
+            str - TIMERS or SAMPLER, or None if value is empty or unknown.
+        """
+
+        mode = value.strip().lower()
+
+        if mode in (self.TIMERS, self.SAMPLER):
+            return mode
+
+        if mode and mode != self._unknown_mode:
+            print(f'Profiler not started, unknown mode in {source}: {value.strip()}')
+
+        self._unknown_mode = mode or None
+        return None
+
+
+    def _record(self, name, seconds):
+        """Add one call to a function's timing."""
+
+        with self._lock:
+            timing = self._timings.get(name)
+
+            if timing is None:
+                self._timings[name] = [1, seconds, seconds]
+
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+
+    def _sampler_main(self):
+        """Entry point of the sampler thread."""
+
+        own_id = threading.get_ident()
+
+        while self.mode == self.SAMPLER:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+
+                while frame:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                    frame = frame.f_back
+
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ';'.join(reversed(stack))
+
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+
+            self._samples += 1
+            sleep(self.interval)
+
+
+    def _dump(self, mode):
+        """Write the aggregated results to the profiles folder."""
+
+        folder = self.data_dir / 'profiles'
+        folder.mkdir(parents=True, exist_ok=True)
+
+        stem = f'profile-{self._started:%Y%m%d-%H%M%S}-{mode}'
+        seconds = (datetime.now() - self._started).total_seconds()
+        lines = [f'Key File Monitor profile ({mode}), {seconds:.1f} s', '']
+
+        if mode == self.TIMERS:
+            lines.append(f'{"calls":>10} {"total ms":>12} {"mean ms":>10} {"max ms":>10}  function')
+
+            with self._lock:
+                timings = sorted(self._timings.items(), key=lambda item: -item[1][1])
+
+            for name, (calls, total, longest) in timings:
+                lines.append(
+                    f'{calls:10} {total * 1000:12.2f} {total * 1000 / calls:10.3f} '
+                    f'{longest * 1000:10.3f}  {name}'
+                )
+
+        else:
+            # Count each function once per sample it appears in
+            inclusive = {}
+
+            for stack, count in self._stacks.items():
+                for function in set(stack.split(';')[1:]):
+                    inclusive[function] = inclusive.get(function, 0) + count
+
+            lines.append(f'{self._samples} samples every {self.interval * 1000:g} ms')
+            lines.append('')
+            lines.append(f'{"samples":>10}  function')
+
+            for function, count in sorted(inclusive.items(), key=lambda item: -item[1])[:50]:
+                lines.append(f'{count:10}  {function}')
+
+            (folder / f'{stem}.collapsed').write_text(
+                ''.join(f'{stack} {count}\n' for stack, count in self._stacks.items()),
+                encoding='utf-8'
+            )
+
+        path = folder / f'{stem}.txt'
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        return path
+
+
+
+PROFILER = Profiler()
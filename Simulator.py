@@ -0,0 +1,443 @@
+"""
+Define the SimulatedDesktop and SimulatedKeyLoader classes.
+
+SimulatedDesktop offers the same interface as Win32Desktop, but its windows
+exist only in memory. WinEvents are queued to the thread that installed the
+hook and delivered when that thread pumps messages, just like out-of-context
+hooks on Windows. SimulatedKeyLoader drives the desktop the same way the demo
+program (demo_keyloader.py) drives the real one.
+
+The demo draws its filename label with Tk, inside a TkChild window that has no
+window text and raises no text change events, so the label cannot be read
+from outside. SimulatedKeyLoader reproduces that by default. Given a label
+class, it instead models a loader whose label is a native control; that is an
+assumption about the R8B software which has not been checked against it.
+"""
+
+import itertools
+import queue
+import threading
+from types import FunctionType
+
+
+
+class SimulatedDesktop:
+    """An in-memory desktop for exercising the WindowWatcher."""
+
+    OBJID_WINDOW = 0
+    OBJID_CLIENT = -4
+
+    EVENT_OBJECT_CREATE = 0x8000
+    EVENT_OBJECT_DESTROY = 0x8001
+    EVENT_OBJECT_SHOW = 0x8002
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    EVENT_OBJECT_VALUECHANGE = 0x800E
+
+    _QUIT = object()
+
+
+    class Window:
+        """Holds info about a simulated window."""
+
+        def __init__(self, hwnd, class_name, title, parent, pid):
+            """Contruct a Window."""
+
+            self.hwnd = hwnd
+            self.class_name = class_name
+            self.title = title
+            self.parent = parent
+            self.pid = pid
+            self.children = []
+            self.destroyed = False
+            self.rect = (100, 300, 600, 500)
+
+
+    def __init__(self):
+        """Initialize an empty desktop."""
+
+        self._lock = threading.RLock()
+        self._windows = {}
+        self._hooks = {}
+        self._queues = {}
+        self._hwnds = itertools.count(0x10000, 2)
+        self._hook_ids = itertools.count(1)
+
+
+    # -- Win32Desktop interface --
+
+    def find_window(self, class_name: str, title: str) -> int:
+        """Find a top level window by class and/or title."""
+
+        with self._lock:
+            for window in self._windows.values():
+                if window.parent == 0 and self._matches(window, class_name, title):
+                    return window.hwnd
+
+        return 0
+
+
+    def enum_windows(self) -> list:
+        """List every top level window as (hwnd, title, class name, pid)."""
+
+        with self._lock:
+            return [
+                (window.hwnd, window.title, window.class_name, window.pid)
+                for window in self._windows.values()
+                if window.parent == 0 and not window.destroyed
+            ]
+
+
+    def find_child(self, parent: int, class_name: str) -> int:
+        """Find the first direct child of a window with the given class."""
+
+        with self._lock:
+            window = self._windows.get(parent)
+
+            for hwnd in window.children if window else []:
+                if self._matches(self._windows[hwnd], class_name, None):
+                    return hwnd
+
+        return 0
+
+
+    def find_children(self, parent: int, class_name: str) -> list:
+        """Find every descendant of a window with the given class."""
+
+        found = []
+
+        with self._lock:
+            window = self._windows.get(parent)
+
+            for hwnd in window.children if window else []:
+                if self._matches(self._windows[hwnd], class_name, None):
+                    found.append(hwnd)
+
+                found.extend(self.find_children(hwnd, class_name))
+
+        return found
+
+
+    def get_root(self, hwnd: int) -> int:
+        """Return the top level window that owns a window."""
+
+        with self._lock:
+            window = self._windows.get(hwnd)
+
+            while window and window.parent:
+                window = self._windows.get(window.parent)
+
+            return window.hwnd if window else 0
+
+
+    def is_window(self, hwnd: int) -> bool:
+        """Return True if the handle refers to an existing window."""
+
+        return hwnd in self._windows
+
+
+    def get_title(self, hwnd: int) -> str:
+        """Return the title of a window."""
+
+        window = self._windows.get(hwnd)
+        return window.title if window else ''
+
+
+    def get_text(self, hwnd: int) -> str:
+        """Return the text of a control."""
+
+        return self.get_title(hwnd)
+
+
+    def get_process_id(self, hwnd: int) -> int:
+        """Return the id of the process that owns a window."""
+
+        window = self._windows.get(hwnd)
+        return window.pid if window else 0
+
+
+    def set_hook(self, event_min: int, event_max: int, proc: FunctionType, pid=0) -> int:
+        """
+        Install a hook whose events are delivered to the calling thread.
+
+        If pid is given, only events from windows of that process are
+        delivered, like the idProcess argument of SetWinEventHook.
+        """
+
+        with self._lock:
+            hook = next(self._hook_ids)
+            self._hooks[hook] = (event_min, event_max, proc, threading.get_ident(), pid)
+            self._queue_for(threading.get_ident())
+
+        return hook
+
+
+    def unhook(self, hook: int):
+        """Remove a hook installed with set_hook()."""
+
+        with self._lock:
+            self._hooks.pop(hook, None)
+
+
+    def get_window_rect(self, hwnd: int) -> tuple:
+        """Return the (left, top, right, bottom) position of a window."""
+
+        window = self._windows.get(hwnd)
+        return window.rect if window else (0, 0, 0, 0)
+
+
+    def set_window_pos(self, hwnd: int, left: int, top: int, width: int, height: int):
+        """Move and resize a window."""
+
+        window = self._windows.get(hwnd)
+
+        if window:
+            window.rect = (left, top, left + width, top + height)
+
+
+    def set_foreground_window(self, hwnd: int):
+        """Windows have no focus on the simulated desktop."""
+
+        pass
+
+
+    def current_thread_id(self) -> int:
+        """Return the id of the calling thread."""
+
+        return threading.get_ident()
+
+
+    def pump_messages(self):
+        """Deliver queued events on the calling thread until post_quit()."""
+
+        messages = self._queue_for(threading.get_ident())
+
+        while True:
+            message = messages.get()
+
+            try:
+                if message is self._QUIT:
+                    return
+
+                message()
+
+            finally:
+                messages.task_done()
+
+
+    def post_quit(self, thread_id: int):
+        """Ask a thread's message loop to exit."""
+
+        self._queue_for(thread_id).put(self._QUIT)
+
+
+    # -- Simulation interface --
+
+    @property
+    def hook_count(self) -> int:
+        """The number of hooks currently installed."""
+
+        return len(self._hooks)
+
+
+    def create_window(self, class_name: str, title='', parent=0, pid=1) -> int:
+        """
+        Create a window and raise EVENT_OBJECT_CREATE for it.
+
+        Returns:
+            int - handle to the new window.
+        """
+
+        with self._lock:
+            hwnd = next(self._hwnds)
+            self._windows[hwnd] = self.Window(hwnd, class_name, title, parent, pid)
+
+            if parent:
+                self._windows[parent].children.append(hwnd)
+
+        self.emit(self.EVENT_OBJECT_CREATE, hwnd)
+        self.emit(self.EVENT_OBJECT_SHOW, hwnd)
+        return hwnd
+
+
+    def destroy_window(self, hwnd: int):
+        """
+        Destroy a window and its children, raising EVENT_OBJECT_DESTROY.
+
+        The windows can no longer be found once this is called, but their
+        handles stay valid until every hook has seen the event.
+        """
+
+        with self._lock:
+            doomed = [hwnd] + self.find_children(hwnd, None)
+
+            for child in doomed:
+                self._windows[child].destroyed = True
+
+        for child in reversed(doomed):
+            self.emit(self.EVENT_OBJECT_DESTROY, child)
+
+        self.flush()
+
+        with self._lock:
+            window = self._windows.get(hwnd)
+
+            if window and window.parent in self._windows:
+                self._windows[window.parent].children.remove(hwnd)
+
+            for child in doomed:
+                self._windows.pop(child, None)
+
+
+    def set_text(self, hwnd: int, text: str, event=EVENT_OBJECT_NAMECHANGE, id_object=OBJID_WINDOW):
+        """Change the text of a window and raise the given event for it."""
+
+        self._windows[hwnd].title = text
+        self.emit(event, hwnd, id_object)
+
+
+    def emit(self, event: int, hwnd: int, id_object=OBJID_WINDOW):
+        """Queue an event to every hook that listens for it."""
+
+        with self._lock:
+            hooks = list(self._hooks.items())
+            window = self._windows.get(hwnd)
+            source = window.pid if window else 0
+
+        for hook, (event_min, event_max, proc, thread_id, pid) in hooks:
+            if event_min <= event <= event_max and pid in (0, source):
+                self._queue_for(thread_id).put(
+                    lambda proc=proc, hook=hook: proc(hook, event, hwnd, id_object, 0, 0, 0)
+                )
+
+
+    def flush(self):
+        """Wait until every queued event has been delivered."""
+
+        with self._lock:
+            threads = {hook[3] for hook in self._hooks.values()}
+
+        for thread_id in threads:
+            self._queue_for(thread_id).join()
+
+
+    def _queue_for(self, thread_id):
+        """Return the message queue of a thread."""
+
+        with self._lock:
+            return self._queues.setdefault(thread_id, queue.Queue())
+
+
+    def _matches(self, window, class_name, title):
+        """Check a window against FindWindow style criteria."""
+
+        return not window.destroyed \
+            and (class_name is None or window.class_name == class_name) \
+            and (title is None or window.title == title)
+
+
+
+class SimulatedKeyLoader:
+    """Plays the part of demo_keyloader.py on a SimulatedDesktop."""
+
+    TITLE = 'Key Loader R8B'
+    DIALOG_TITLE = 'Open a Distribituion Key File...'
+    NO_FILE = 'No file selected'
+
+
+    def __init__(self, desktop: SimulatedDesktop, pid=1000, label_class=None):
+        """
+        Initialize a simulated key loader.
+
+        Args:
+            desktop (SimulatedDesktop): The desktop to create windows on.
+            pid (int): The process id reported for the loader's windows.
+            label_class (str): Model the filename label as a native control
+                               of this class, whose text can be read and
+                               which raises NAMECHANGE when it changes
+                               (default None, a Tk label like the demo's).
+        """
+
+        self.desktop = desktop
+        self.pid = pid
+        self.label_class = label_class
+        self.hwnd = 0
+        self.label = 0
+        self.dialog = 0
+        self.edit = 0
+
+
+    def launch(self):
+        """Show the main window with its "Browse" button and filename label."""
+
+        self.hwnd = self.desktop.create_window('TkTopLevel', self.TITLE, pid=self.pid)
+
+        # Tk puts the widgets of a toplevel in a TkChild window of their own
+        client = self.desktop.create_window('TkChild', parent=self.hwnd, pid=self.pid)
+        row = self.desktop.create_window('TkChild', parent=client, pid=self.pid)
+        self.desktop.create_window('Button', 'Browse', parent=row, pid=self.pid)
+
+        if self.label_class:
+            self.label = self.desktop.create_window(
+                self.label_class, self.NO_FILE, parent=row, pid=self.pid
+            )
+
+        else:
+            self.label = self.desktop.create_window('TkChild', parent=row, pid=self.pid)
+
+
+    def open_dialog(self):
+        """Press "Browse" to show the "Open" dialog."""
+
+        self.dialog = self.desktop.create_window('#32770', self.DIALOG_TITLE, pid=self.pid)
+        combo_ex = self.desktop.create_window('ComboBoxEx32', parent=self.dialog, pid=self.pid)
+        combo = self.desktop.create_window('ComboBox', parent=combo_ex, pid=self.pid)
+        self.edit = self.desktop.create_window('Edit', parent=combo, pid=self.pid)
+
+
+    def type(self, text: str):
+        """Type into the dialog's filename field one keystroke at a time."""
+
+        for end in range(1, len(text) + 1):
+            self.desktop.set_text(
+                self.edit,
+                text[:end],
+                SimulatedDesktop.EVENT_OBJECT_VALUECHANGE,
+                SimulatedDesktop.OBJID_CLIENT
+            )
+
+
+    def choose(self, filename: str):
+        """Type a filename, press "Open" and show it in the label."""
+
+        self.type(filename)
+        self._close_dialog()
+
+        # A Tk label is redrawn without any change visible to other processes
+        if self.label_class:
+            self.desktop.set_text(self.label, filename)
+
+
+    def cancel(self, typed=''):
+        """Optionally type something, then press "Cancel"."""
+
+        self.type(typed)
+        self._close_dialog()
+
+
+    def close(self):
+        """Close the main window."""
+
+        if self.dialog:
+            self._close_dialog()
+
+        self.desktop.destroy_window(self.hwnd)
+        self.hwnd = 0
+        self.label = 0
+
+
+    def _close_dialog(self):
+        """Destroy the "Open" dialog."""
+
+        self.desktop.destroy_window(self.dialog)
+        self.dialog = 0
+        self.edit = 0
@@ -0,0 +1,96 @@
+"""
+Define the DesktopSnapshot class.
+
+A snapshot lists every top level window once and indexes them by title, class
+and process, so that the application can find everything it needs at startup
+without a separate FindWindow search for each window.
+"""
+
+from time import perf_counter
+
+
+
+class DesktopSnapshot:
+    """An index of the top level windows at one moment."""
+
+    class Window:
+        """Holds info about a top level window."""
+
+        def __init__(self, hwnd: int, title: str, class_name: str, pid: int):
+            """Contruct a Window."""
+
+            self.hwnd = hwnd
+            self.title = title
+            self.class_name = class_name
+            self.pid = pid
+
+
+    def __init__(self, windows: list, elapsed=0.0):
+        """
+        Build the indexes.
+
+        Args:
+            windows (list): (hwnd, title, class name, process id) tuples in
+                            Z order, as returned by enum_windows().
+            elapsed (float): Seconds spent taking the snapshot (default 0.0).
+        """
+
+        self.elapsed = elapsed
+        self.windows = {}
+        self.by_title = {}
+        self.by_class = {}
+        self.by_pid = {}
+
+        for fields in windows:
+            window = self.Window(*fields)
+            self.windows[window.hwnd] = window
+            self.by_title.setdefault(window.title, []).append(window)
+            self.by_class.setdefault(window.class_name, []).append(window)
+            self.by_pid.setdefault(window.pid, []).append(window)
+
+
+    @classmethod
+    def take(cls, desktop):
+        """
+        Enumerate the top level windows of a desktop.
+
+        Args:
+            desktop (Win32Desktop, SimulatedDesktop): The desktop to list.
+
+        Returns:
+            DesktopSnapshot - the indexed windows.
+        """
+
+        start = perf_counter()
+        windows = desktop.enum_windows()
+        snapshot = cls(windows)
+        snapshot.elapsed = perf_counter() - start
+        return snapshot
+
+
+    def find(self, class_name: str, title: str) -> int:
+        """
+        Find a window like FindWindow would, without asking the desktop.
+
+        Args:
+            class_name (str): The window class name, or None for any class.
+            title (str): The window title, or None for any title.
+
+        Returns:
+            int - handle to the topmost matching window, or 0 if not found.
+        """
+
+        if title is not None:
+            candidates = self.by_title.get(title, [])
+
+        elif class_name is not None:
+            candidates = self.by_class.get(class_name, [])
+
+        else:
+            candidates = list(self.windows.values())
+
+        for window in candidates:
+            if class_name is None or window.class_name == class_name:
+                return window.hwnd
+
+        return 0
@@ -8,14 +8,12 @@ message loop and window.
 """
 
 import threading
-import ctypes
-import ctypes.wintypes
-import pythoncom
-import win32gui
-import win32con
-import win32api
 from types import FunctionType
-from time import sleep
+from time import time, monotonic
+from State import StateStore
+from Dispatch import CallbackExecutor
+from Snapshot import DesktopSnapshot
+from Profiler import PROFILER
 
 
 
@@ -24,8 +22,12 @@ class WindowWatcher:
 
     EVENT_OBJECT_CREATE = 0x8000
     EVENT_OBJECT_DESTROY = 0x8001
+    EVENT_OBJECT_SHOW = 0x8002
+    EVENT_OBJECT_NAMECHANGE = 0x800C
     EVENT_OBJECT_VALUECHANGE = 0x800E
-    WINEVENT_OUTOFCONTEXT = 0
+
+    IDLE = 'idle'
+    ACTIVE = 'active'
 
 
     class WindowInfo:
@@ -34,7 +36,6 @@ class WindowWatcher:
         def __init__(
             self,
             title: str,
-            hwnd: int,
             on_create: FunctionType,
             on_destroy: FunctionType,
             on_edit=None
@@ -45,58 +46,130 @@ class WindowWatcher:
             self.on_create = on_create
             self.on_destroy = on_destroy
             self.on_edit = on_edit
-            self.hwnd = hwnd
 
 
-    def __init__(self, daemon=True):
+    class LabelInfo:
+        """Holds info about a text control inside the target window."""
+
+        def __init__(
+            self,
+            class_name: str,
+            index: int,
+            on_change: FunctionType,
+            placeholder: str
+        ):
+            """Contruct a LabelInfo."""
+
+            self.class_name = class_name
+            self.index = index
+            self.on_change = on_change
+            self.placeholder = placeholder
+            self.text = None
+
+
+    def __init__(
+        self,
+        daemon=True,
+        store=None,
+        desktop=None,
+        idle=True,
+        executor=None,
+        shutdown_timeout=2.0
+    ):
         """
         Initialize a window watcher.
 
+        Window and dialog handles are kept in the state store rather than on
+        the watcher, so other threads can read them as a consistent snapshot.
+
+        While the target window is absent the watcher is idle, and only the
+        create and show hooks are installed. The destroy and text change
+        hooks are added when the target window appears, for its process only,
+        and removed again when it is destroyed. In label mode the text change
+        hook receives NAMECHANGE alone, otherwise VALUECHANGE alone.
+
         Args:
             daemon (bool): Run the window watcher thread as a daemon
                           (default True).
+            store (StateStore): Where to record window handles
+                                (default a new StateStore).
+            desktop (Win32Desktop, SimulatedDesktop): Access to the windows
+                                                      being watched
+                                                      (default Win32Desktop).
+            idle (bool): Remove the unneeded hooks while the target window is
+                         absent (default True). If False every hook stays
+                         installed for the life of the watcher.
+            executor (CallbackExecutor): Runs the target callbacks
+                                         (default a new CallbackExecutor,
+                                         started and shut down with the
+                                         watcher). Pass a SynchronousExecutor
+                                         to run them on the hook thread
+                                         instead. An executor passed in is
+                                         left for the caller to shut down.
+            shutdown_timeout (float): Seconds stop() may take before giving
+                                      up on threads that have not finished
+                                      (default 2.0).
         """
 
+        if desktop is None:
+            from Desktop import Win32Desktop
+            desktop = Win32Desktop()
+
         self.daemon = daemon
+        self.store = store if store is not None else StateStore()
+        self.desktop = desktop
+        self.idle = idle
+        self.shutdown_timeout = shutdown_timeout
+        self.executor = executor if executor is not None else CallbackExecutor(daemon=daemon)
+        self._owns_executor = executor is None
 
         self._window = None
+        self._window_pid = 0
         self._dialog = None
-        self._edit_control = None
+        self._label = None
+        self._snapshot = None
 
         self._window_thread = None
         self._dialog_thread = None
         self._window_thread_id = None
-        self._dialog_thread_id = None
 
-        self._window_event_proc = None
-        self._window_event_hook = None
-        self._dialog_event_hook = None
+        # Set by stop() to wake threads that are waiting
+        self._stop_event = threading.Event()
 
-        self.running = False
+        # Set once the window thread has its message queue and hooks
+        self._thread_ready = threading.Event()
 
+        self._idle_hooks = []
+        self._active_hooks = []
 
-        # Define the callback type used by the SetWinEventHook API
-        self.WinEventProcType = ctypes.WINFUNCTYPE(
-            None,
-            ctypes.wintypes.HANDLE,
-            ctypes.wintypes.DWORD,
-            ctypes.wintypes.HWND,
-            ctypes.wintypes.LONG,
-            ctypes.wintypes.LONG,
-            ctypes.wintypes.DWORD,
-            ctypes.wintypes.DWORD
-        )
+        # Callback counts and time spent in each mode, for callback_rates()
+        self._mode = self.IDLE
+        self._mode_since = monotonic()
+        self._mode_seconds = {self.IDLE: 0.0, self.ACTIVE: 0.0}
+        self._callback_counts = {self.IDLE: 0, self.ACTIVE: 0}
+
+        self.running = False
 
 
     def start(self):
         """Start the window watcher thread."""
 
         self.running = True
+        self._stop_event.clear()
+
+        # Restarted if an earlier stop() shut it down
+        if self._owns_executor:
+            self.executor.start()
+
+        # From here on the hooks keep the state current
+        self._snapshot = None
 
         if not self._window_thread or not self._window_thread.is_alive():
 
+            self._thread_ready.clear()
             self._window_thread = threading.Thread(
                 target=self._window_thread_main,
+                name='window-watcher',
                 daemon=self.daemon
             )
             self._window_thread.start()
@@ -106,33 +179,118 @@ class WindowWatcher:
         print('Spy is starting')
 
 
-    def stop(self):
-        """Stop the window watcher thread."""
+    def stop(self, timeout=None) -> float:
+        """
+        Stop the watcher threads and wait for them to finish.
 
-        self.running = False
+        The window thread is asked to quit its message loop and removes its
+        own hooks on the way out, since hooks belong to the thread that
+        installed them. Threads waiting between polls are woken at once.
+        An executor the watcher created itself is shut down too. Everything
+        shares one deadline, and anything still running when it passes is
+        reported and left to end with the process.
 
-        if self._window_event_hook:
-            ctypes.windll.user32.UnhookWinEvent(self._window_event_hook)
-            self._window_event_hook = None
+        Args:
+            timeout (float): Seconds allowed for the whole shutdown
+                             (default shutdown_timeout).
+
+        Returns:
+            float - the seconds the shutdown took.
+        """
 
-        if self._dialog_event_hook:
-            ctypes.windll.user32.UnhookWinEvent(self._dialog_event_hook)
-            self._dialog_event_hook = None
+        if timeout is None:
+            timeout = self.shutdown_timeout
 
-        if self._window_thread_id and self._window_thread.is_alive():
-            win32api.PostThreadMessage(
-                self._window_thread_id, win32con.WM_QUIT, 0, 0
-            )
-            self._window_thread_id = None
+        start = monotonic()
+        deadline = start + timeout
 
-        if self._dialog_thread_id and self._dialog_thread.is_alive():
-            win32api.PostThreadMessage(
-                self._dialog_thread_id, win32con.WM_QUIT, 0, 0
-            )
-            self._dialog_thread_id = None
+        def remaining():
+            return max(deadline - monotonic(), 0)
+
+        self.running = False
+        self._stop_event.set()
 
         print('Spy is stopping')
 
+        window_thread = self._window_thread
+
+        if window_thread and window_thread.is_alive():
+            self._thread_ready.wait(remaining())
+
+            if self._window_thread_id:
+                self.desktop.post_quit(self._window_thread_id)
+
+            window_thread.join(remaining())
+
+        if self._dialog_thread:
+            self._dialog_thread.join(remaining())
+
+        executor_stopped = True
+
+        if self._owns_executor:
+            executor_stopped = self.executor.shutdown(remaining())
+
+        elapsed = monotonic() - start
+        stragglers = [
+            thread.name
+            for thread in (window_thread, self._dialog_thread)
+            if thread and thread.is_alive()
+        ]
+
+        if not executor_stopped:
+            stragglers.append('callback workers')
+
+        if stragglers:
+            print(f'Spy stopped in {elapsed * 1000:.1f} ms, still running: {", ".join(stragglers)}')
+
+        else:
+            print(f'Spy stopped in {elapsed * 1000:.1f} ms')
+
+        for mode, rate in self.callback_rates().items():
+            print(f'Callbacks while {mode}: {rate:.1f}/min')
+
+        print('Callbacks:', self.executor.stats.report())
+
+        return elapsed
+
+
+    def callback_rates(self) -> dict:
+        """
+        Measure how busy the hooks have been.
+
+        Returns:
+            dict - callbacks per minute, keyed by IDLE and ACTIVE.
+        """
+
+        seconds = dict(self._mode_seconds)
+        seconds[self._mode] += monotonic() - self._mode_since
+
+        return {
+            mode: self._callback_counts[mode] * 60 / seconds[mode] if seconds[mode] else 0.0
+            for mode in seconds
+        }
+
+
+    def take_snapshot(self) -> DesktopSnapshot:
+        """
+        List the top level windows once for the target_*() calls to use.
+
+        Without a snapshot each registration searches the desktop itself.
+        The snapshot is discarded when the watcher starts.
+
+        Returns:
+            DesktopSnapshot - the indexed windows.
+        """
+
+        self._snapshot = DesktopSnapshot.take(self.desktop)
+
+        print(
+            f'Desktop snapshot: {len(self._snapshot.windows)} windows in '
+            f'{self._snapshot.elapsed * 1000:.1f} ms'
+        )
+
+        return self._snapshot
+
 
     def target_window(
         self,
@@ -157,8 +315,10 @@ class WindowWatcher:
         if self.running:
             raise Exception('Cannot register window while WindowWatcher is running')
 
-        hwnd = win32gui.FindWindow(None, title)
-        self._window = self.WindowInfo(title, hwnd, on_create, on_destroy)
+        hwnd = self._find_window(None, title)
+        self._window = self.WindowInfo(title, on_create, on_destroy)
+        self._window_pid = self._find_process(hwnd)
+        self.store.update(loader_hwnd=hwnd, loader_time=time())
         return hwnd
 
 
@@ -172,6 +332,9 @@ class WindowWatcher:
         """
         Register a dialog window for create and destroy events.
 
+        If the dialog is already open, on_create is called for it and on_edit
+        is called with whatever has been typed into it so far.
+
         Args:
             title (str): The title string of the target dialog.
             on_create (FunctionType): Function to call on dialog creation.
@@ -188,69 +351,164 @@ class WindowWatcher:
         if self.running:
             raise Exception('Cannot register dialog while WindowWatcher is running')
 
-        hwnd = win32gui.FindWindow(None, title)
-        self._dialog = self.WindowInfo(
-            title, hwnd, on_create, on_destroy, on_edit
-        )
+        hwnd = self._find_window(None, title)
+        self._dialog = self.WindowInfo(title, on_create, on_destroy, on_edit)
+        self.store.update(dialog_hwnd=hwnd, dialog_time=time())
+
+        if hwnd != 0:
+            if on_create:
+                self.executor.submit('dialog', on_create, hwnd)
+
+            edit_hwnd = self._resolve_edit(hwnd)
+
+            if edit_hwnd and on_edit:
+                self.executor.submit(
+                    'dialog', on_edit, self.desktop.get_text(edit_hwnd), coalesce=True
+                )
+
         return hwnd
 
 
+    def target_label(
+        self,
+        class_name: str,
+        on_change: FunctionType,
+        index=0,
+        placeholder=None
+    ) -> str:
+        """
+        Register a text control inside the target window for text changes.
+
+        The control is read once each time its name or value changes, instead
+        of following every keystroke in the "Open" dialog. Must be called
+        after target_window().
+
+        Args:
+            class_name (str): The window class of the control.
+            on_change (FunctionType): Function to call when the text changes.
+                                      Should accept a single string as an
+                                      argument, representing the new text.
+            index (int): Which control of that class to use, counting the
+                         target window's descendants in Z order (default 0).
+            placeholder (str): Text the control shows while no file is
+                               selected. It is never passed to on_change, and
+                               neither is empty text (default None).
+
+        Returns:
+            str - the current text of the control, or None if not present.
+        """
+
+        if self.running:
+            raise Exception('Cannot register label while WindowWatcher is running')
+
+        self._label = self.LabelInfo(class_name, index, on_change, placeholder)
+        self._resolve_label(self.store.state.loader_hwnd)
+        return self._label.text
+
+
     def _window_thread_main(self):
         """Entry point of the window watcher thread."""
 
-        self._window_thread_id = win32api.GetCurrentThreadId()
+        self._window_thread_id = self.desktop.current_thread_id()
 
-        self._window_event_proc = self.WinEventProcType(
-            self._handle_event
-        )
+        try:
+            # A window's title may be set after it is created, so watch both
+            for event in (self.EVENT_OBJECT_CREATE, self.EVENT_OBJECT_SHOW):
+                self._idle_hooks.append(
+                    self.desktop.set_hook(event, event, self._handle_event)
+                )
+
+            if self.store.state.loader_hwnd != 0:
+                self._install_active_hooks()
+
+            elif not self.idle:
+                self._install_active_hooks()
+                self._set_mode(self.IDLE)
+
+            self._thread_ready.set()
+
+            if self.running:
+                self.desktop.pump_messages()
+
+        finally:
+            # Hooks must be removed by the thread that installed them
+            self._remove_active_hooks()
+
+            while self._idle_hooks:
+                self.desktop.unhook(self._idle_hooks.pop())
+
+            self._window_thread_id = None
+            self._thread_ready.set()
+
+
+    def _install_active_hooks(self):
+        """Add the hooks only needed while the target window exists."""
 
-        self._window_event_hook = ctypes.windll.user32.SetWinEventHook(
-            self.EVENT_OBJECT_CREATE,
+        self._set_mode(self.ACTIVE)
+
+        if self._active_hooks:
+            return
+
+        # Only the target window's process matters once it is known
+        pid = self._window_pid if self.store.state.loader_hwnd else 0
+
+        self._active_hooks.append(self.desktop.set_hook(
             self.EVENT_OBJECT_DESTROY,
-            0,
-            self._window_event_proc,
-            0,
-            0,
-            self.WINEVENT_OUTOFCONTEXT
-        )
+            self.EVENT_OBJECT_DESTROY,
+            self._handle_event,
+            pid
+        ))
 
-        self._dialog_event_hook = ctypes.windll.user32.SetWinEventHook(
-            self.EVENT_OBJECT_VALUECHANGE,
-            self.EVENT_OBJECT_VALUECHANGE,
-            0,
-            self._window_event_proc,
-            0,
-            0,
-            self.WINEVENT_OUTOFCONTEXT
-        )
+        # A label reports text changes as NAMECHANGE, an edit field as VALUECHANGE
+        event = self.EVENT_OBJECT_NAMECHANGE if self._label else self.EVENT_OBJECT_VALUECHANGE
+
+        self._active_hooks.append(self.desktop.set_hook(
+            event,
+            event,
+            self._handle_event,
+            pid
+        ))
+
+
+    def _remove_active_hooks(self):
+        """Remove the hooks only needed while the target window exists."""
 
-        pythoncom.PumpMessages()
+        while self._active_hooks:
+            self.desktop.unhook(self._active_hooks.pop())
+
+        self._set_mode(self.IDLE)
+
+
+    def _set_mode(self, mode):
+        """Switch between IDLE and ACTIVE, keeping time for callback_rates()."""
+
+        now = monotonic()
+        self._mode_seconds[self._mode] += now - self._mode_since
+        self._mode_since = now
+        self._mode = mode
 
 
     def _dialog_thread_main(self):
         """Entry point of the dialog watcher thread."""
 
-        self._dialog_thread_id = win32api.GetCurrentThreadId()
         print('Poll dialog - Start')
         while self.running:
 
-            hwnd = win32gui.FindWindow('#32770', self._dialog.title)
+            hwnd = self.desktop.find_window('#32770', self._dialog.title)
 
             if hwnd != 0:
                 print('Dialog created:', self._dialog.title, hwnd)
 
-                self._dialog.hwnd = hwnd
+                self.store.update(dialog_hwnd=hwnd, dialog_time=time())
 
                 if self._dialog.on_create:
-                    self._dialog.on_create(hwnd)
+                    self.executor.submit('dialog', self._dialog.on_create, hwnd)
 
-                combo_box_hwnd = win32gui.FindWindowEx(hwnd, None, 'ComboBoxEx32', None)
-                combo_box_hwnd = win32gui.FindWindowEx(combo_box_hwnd, None, 'ComboBox', None)
-                self._edit_control = win32gui.FindWindowEx(combo_box_hwnd, None, 'Edit', None)
+                self._resolve_edit(hwnd)
 
                 break
 
-            sleep(0.2)
+            self._stop_event.wait(0.2)
 
         print('Poll dialog - Stop')
 
@@ -258,15 +516,21 @@ class WindowWatcher:
     def _start_dialog_thread(self):
         """Like it says."""
 
+        # Nothing to poll for if the dialog is already known
+        if not self._dialog or self.store.state.dialog_hwnd != 0:
+            return
+
         if not self._dialog_thread or not self._dialog_thread.is_alive():
-            if self._window.hwnd != 0:
+            if self.store.state.loader_hwnd != 0:
                 self._dialog_thread = threading.Thread(
                     target=self._dialog_thread_main,
+                    name='dialog-watcher',
                     daemon=self.daemon
                 )
                 self._dialog_thread.start()
 
 
+    @PROFILER.timed
     def _handle_event(
         self,
         hWinEventHook,
@@ -279,73 +543,164 @@ class WindowWatcher:
     ):
         """Handle window create and destroy events."""
 
+        self._callback_counts[self._mode] += 1
+
         if hwnd:
-            if win32gui.IsWindow(hwnd) and idObject == win32con.OBJID_WINDOW:
-                if event == self.EVENT_OBJECT_CREATE:
+            if event == self.EVENT_OBJECT_VALUECHANGE \
+            or event == self.EVENT_OBJECT_NAMECHANGE:
+                self._handle_value_changed(hwnd)
+
+            elif self.desktop.is_window(hwnd) and idObject == self.desktop.OBJID_WINDOW:
+                if event == self.EVENT_OBJECT_CREATE \
+                or event == self.EVENT_OBJECT_SHOW:
                     self._handle_window_creation(hwnd)
 
                 elif event == self.EVENT_OBJECT_DESTROY:
                     self._handle_window_destruction(hwnd)
 
-            elif event == self.EVENT_OBJECT_VALUECHANGE:
-                self._handle_value_changed(hwnd)
-
 
     def _handle_window_creation(self, hwnd):
         """Check to see if a target window is created."""
 
-        if self._window.hwnd != 0:
+        state = self.store.state
+
+        if state.loader_hwnd != 0:
+            # The label may be created after its top level window
+            if self._label and state.label_hwnd == 0 \
+            and self.desktop.get_root(hwnd) == state.loader_hwnd:
+                self._resolve_label(state.loader_hwnd)
+
             return
 
-        title = win32gui.GetWindowText(hwnd)
+        title = self.desktop.get_title(hwnd)
 
         if title == self._window.title:
             print('Window created:', title, hwnd)
 
-            self._window.hwnd = hwnd
+            self._window_pid = self._find_process(hwnd)
+            self.store.update(loader_hwnd=hwnd, loader_time=time())
+            self._install_active_hooks()
 
             if self._window.on_create:
-                self._window.on_create(hwnd)
+                self.executor.submit('window', self._window.on_create, hwnd)
 
+            self._resolve_label(hwnd)
             self._start_dialog_thread()
 
 
     def _handle_window_destruction(self, hwnd):
         """Check to see if a target window is destroyed."""
 
-        if self._dialog.hwnd == hwnd:
+        state = self.store.state
+
+        if self._dialog and state.dialog_hwnd == hwnd:
             print('Dialog destroyed:', self._dialog.title, hwnd)
 
             if self._dialog.on_destroy:
-                self._dialog.on_destroy()
+                self.executor.submit('dialog', self._dialog.on_destroy)
 
-            self._edit_control = None
-            self._dialog.hwnd = 0
+            self.store.update(edit_hwnd=0, dialog_hwnd=0, dialog_time=time())
 
-            while win32gui.FindWindow('#32770', self._dialog.title):
-                sleep(0.01)
+            while self.running and self.desktop.find_window('#32770', self._dialog.title):
+                self._stop_event.wait(0.01)
 
             self._start_dialog_thread()
 
             return
 
-        if self._window.hwnd != hwnd:
+        if state.loader_hwnd != hwnd:
             return
 
         print('Window destroyed:', self._window.title, hwnd)
 
-        self._window.hwnd = 0
+        self.store.update(loader_hwnd=0, label_hwnd=0, loader_time=time())
+
+        if self.idle:
+            self._remove_active_hooks()
+
+        else:
+            self._set_mode(self.IDLE)
 
         if self._window.on_destroy:
-            self._window.on_destroy()
+            self.executor.submit('window', self._window.on_destroy)
 
 
     def _handle_value_changed(self, hwnd):
-        """Check if the edit control text has been modified."""
+        """Check if the label or edit control text has been modified."""
+
+        state = self.store.state
 
-        if self._edit_control and hwnd == self._edit_control:
-            buffer = ctypes.create_unicode_buffer(512)
-            win32gui.SendMessage(hwnd, win32con.WM_GETTEXT, 512, buffer)
+        if state.label_hwnd and hwnd == state.label_hwnd:
+            self._read_label(hwnd)
 
+        elif state.edit_hwnd and hwnd == state.edit_hwnd:
+            text = self.desktop.get_text(hwnd)
+
+            # Only the latest text matters if the callback falls behind
             if self._dialog.on_edit:
-                self._dialog.on_edit(buffer.value)
+                self.executor.submit('dialog', self._dialog.on_edit, text, coalesce=True)
+
+
+    def _find_window(self, class_name, title):
+        """Find a top level window, using the snapshot if there is one."""
+
+        if self._snapshot:
+            return self._snapshot.find(class_name, title)
+
+        return self.desktop.find_window(class_name, title)
+
+
+    def _find_process(self, hwnd):
+        """Find the process that owns a window, using the snapshot if there is one."""
+
+        if not hwnd:
+            return 0
+
+        if self._snapshot and hwnd in self._snapshot.windows:
+            return self._snapshot.windows[hwnd].pid
+
+        return self.desktop.get_process_id(hwnd)
+
+
+    def _resolve_edit(self, dialog_hwnd):
+        """Find the filename edit control inside the "Open" dialog."""
+
+        combo_box_hwnd = self.desktop.find_child(dialog_hwnd, 'ComboBoxEx32')
+        combo_box_hwnd = self.desktop.find_child(combo_box_hwnd, 'ComboBox')
+        edit_hwnd = self.desktop.find_child(combo_box_hwnd, 'Edit')
+
+        self.store.update(edit_hwnd=edit_hwnd)
+        return edit_hwnd
+
+
+    def _resolve_label(self, loader_hwnd):
+        """Find the target label inside the target window and read it."""
+
+        if not self._label or not loader_hwnd:
+            return
+
+        labels = self.desktop.find_children(loader_hwnd, self._label.class_name)
+
+        if len(labels) > self._label.index:
+            label_hwnd = labels[self._label.index]
+            self.store.update(label_hwnd=label_hwnd)
+            self._read_label(label_hwnd)
+
+
+    def _read_label(self, hwnd):
+        """Read the label once and report it if the text is new."""
+
+        text = self.desktop.get_text(hwnd)
+
+        # NAMECHANGE and VALUECHANGE may both be raised for one change
+        if text == self._label.text:
+            return
+
+        self._label.text = text
+
+        # Nothing has been selected yet
+        if not text or text == self._label.placeholder:
+            return
+
+        if self._label.on_change:
+            self.executor.submit('label', self._label.on_change, text)
@@ -0,0 +1,167 @@
+"""
+Define the AppState and StateStore classes.
+
+The application state is held in a single immutable AppState object. Every
+change produces a new AppState with a higher version number, which is swapped
+in atomically. Readers on any thread simply grab the current object and get a
+consistent snapshot without taking a lock. Subscribers are told only about the
+fields that actually changed.
+"""
+
+import threading
+from dataclasses import dataclass, fields, replace
+from types import FunctionType
+
+
+
+@dataclass(frozen=True)
+class AppState:
+    """
+    An immutable snapshot of the application state.
+
+    Fields:
+        version (int): Incremented on every change.
+        loader_hwnd (int): Handle to the key loader window (0 if absent).
+        dialog_hwnd (int): Handle to the "Open" dialog (0 if absent).
+        edit_hwnd (int): Handle to the dialog's filename edit control.
+        label_hwnd (int): Handle to the loader's filename label.
+        pending_filename (str): Filename typed so far in the "Open" dialog.
+        committed_filename (str): The key filename currently selected.
+        loader_time (float): When the loader handle last changed.
+        dialog_time (float): When the dialog handle last changed.
+        committed_time (float): When the selected filename last changed.
+    """
+
+    version: int = 0
+    loader_hwnd: int = 0
+    dialog_hwnd: int = 0
+    edit_hwnd: int = 0
+    label_hwnd: int = 0
+    pending_filename: str = ''
+    committed_filename: str = ''
+    loader_time: float = 0.0
+    dialog_time: float = 0.0
+    committed_time: float = 0.0
+
+
+
+class StateStore:
+    """Holds the current AppState and notifies subscribers of changes."""
+
+    FIELDS = frozenset(f.name for f in fields(AppState)) - {'version'}
+
+
+    def __init__(self, initial: AppState = None):
+        """
+        Initialize a state store.
+
+        Args:
+            initial (AppState): The starting state (default AppState()).
+        """
+
+        self._state = initial if initial is not None else AppState()
+        self._subscribers = []
+
+        # Only writers take the lock, it keeps versions and notifications in order
+        self._lock = threading.RLock()
+
+
+    @property
+    def state(self) -> AppState:
+        """The current state snapshot. Safe to read from any thread."""
+
+        return self._state
+
+
+    def update(self, **changes) -> AppState:
+        """
+        Replace the state with a copy that has the given fields changed.
+
+        Fields whose value is unchanged are ignored. If nothing changes, the
+        version is not incremented and subscribers are not notified.
+
+        Args:
+            **changes: New values for AppState fields.
+
+        Returns:
+            AppState - the resulting state snapshot.
+        """
+
+        unknown = set(changes) - self.FIELDS
+
+        if unknown:
+            raise AttributeError(f'Unknown state fields: {", ".join(sorted(unknown))}')
+
+        with self._lock:
+            old = self._state
+
+            diff = {
+                name: (getattr(old, name), value)
+                for name, value in changes.items()
+                if getattr(old, name) != value
+            }
+
+            if not diff:
+                return old
+
+            new = replace(
+                old,
+                version=old.version + 1,
+                **{name: values[1] for name, values in diff.items()}
+            )
+            self._state = new
+
+            for callback in list(self._subscribers):
+                callback(diff, new)
+
+            return new
+
+
+    def subscribe(self, callback: FunctionType, replay=False) -> AppState:
+        """
+        Register a function to be called whenever the state changes.
+
+        The current state is read while no writer can change it, so no update
+        falls between it and the first notification.
+
+        Args:
+            callback (FunctionType): Called with two arguments, a dict mapping
+                                     each changed field to an (old, new) tuple
+                                     and the new AppState.
+            replay (bool): Also call callback now, with every field that
+                           differs from its AppState default reported as
+                           changed from that default (default False).
+
+        Returns:
+            AppState - the state at the time of subscribing.
+        """
+
+        with self._lock:
+            state = self._state
+            self._subscribers.append(callback)
+
+            if replay:
+                default = AppState()
+                diff = {
+                    name: (getattr(default, name), getattr(state, name))
+                    for name in self.FIELDS
+                    if getattr(default, name) != getattr(state, name)
+                }
+
+                if diff:
+                    callback(diff, state)
+
+            return state
+
+
+    def unsubscribe(self, callback: FunctionType):
+        """
+        Remove a previously registered subscriber.
+
+        Args:
+            callback (FunctionType): The function passed to subscribe().
+        """
+
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
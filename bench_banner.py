@@ -0,0 +1,104 @@
+"""
+Banner Benchmark.
+
+Counts the Tk calls made by banner updates and tooltip hovers, with the
+banner window hidden. Every call into Tcl is counted by wrapping the Tk
+interpreter before any widget is created.
+
+Usage: python bench_banner.py [--updates N]
+"""
+
+import argparse
+import tkinter as tk
+from time import perf_counter
+
+from Banner import KeyMonitorBanner, Tooltip
+from Simulator import SimulatedDesktop
+
+
+def main():
+    """Entry point of the benchmark."""
+
+    parser = argparse.ArgumentParser(description='Key File Monitor banner benchmark')
+    parser.add_argument('--updates', type=int, default=1000,
+                        help='Number of updates in each scenario.')
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    counter = CountingTk(root.tk)
+    root.tk = counter
+
+    banner = KeyMonitorBanner(desktop=SimulatedDesktop(), root=root)
+    banner.root.withdraw()
+    tooltip = Tooltip(banner.outer_frame, 'Benchmark tooltip', delay=0)
+
+    names = [f'C:/Keys/key{number}.key' for number in range(7)]
+
+    scenarios = [
+        ('same file again', lambda i: banner._set_filename(names[0])),
+        ('different file', lambda i: banner._set_filename(names[i % len(names)])),
+        ('tooltip show/hide', lambda i: (tooltip.show(), tooltip.hide())),
+    ]
+
+    print(f'{"scenario":20} {"Tk calls/update":>16} {"us/update":>10}')
+
+    for name, update in scenarios:
+        update(-1)
+        root.update()
+
+        counter.calls = 0
+        start = perf_counter()
+
+        for number in range(args.updates):
+            update(number)
+
+        elapsed = perf_counter() - start
+
+        print(
+            f'{name:20} {counter.calls / args.updates:16.2f} '
+            f'{elapsed * 1e6 / args.updates:10.1f}'
+        )
+
+    root.destroy()
+
+
+
+class CountingTk:
+    """Wraps a Tk interpreter and counts the calls that reach Tcl."""
+
+    COUNTED = {
+        'call', 'eval', 'setvar', 'getvar', 'globalsetvar', 'globalgetvar',
+        'createcommand', 'deletecommand',
+    }
+
+
+    def __init__(self, tkapp):
+        """
+        Initialize the wrapper.
+
+        Args:
+            tkapp: The interpreter of a tkinter.Tk, i.e. its tk attribute.
+        """
+
+        self._tkapp = tkapp
+        self.calls = 0
+
+
+    def __getattr__(self, name):
+        """Return the interpreter's attribute, counting calls into Tcl."""
+
+        attribute = getattr(self._tkapp, name)
+
+        if name not in self.COUNTED:
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+
+        return counted
+
+
+
+if __name__ == "__main__":
+    main()
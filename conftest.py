@@ -0,0 +1,58 @@
+"""Fixtures shared by the tests."""
+
+import time
+import pytest
+from Simulator import SimulatedDesktop
+
+
+
+class RecordingView:
+    """Takes the place of the banner and records what it is asked to show."""
+
+    def __init__(self):
+        """Initialize an empty record."""
+
+        self.attached = []
+        self.filenames = []
+        self.closed = False
+
+    def attach_to_window(self, window_handle):
+        self.attached.append(window_handle)
+
+    def set_filename(self, filename):
+        self.filenames.append(filename)
+
+    def close(self):
+        self.closed = True
+
+
+
+def _wait_for(condition, timeout=2.0):
+    """Poll until condition() is true, failing if the timeout passes first."""
+
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def desktop():
+    """An empty SimulatedDesktop."""
+
+    return SimulatedDesktop()
+
+
+@pytest.fixture
+def view():
+    """A RecordingView to pass to App in place of the banner."""
+
+    return RecordingView()
+
+
+@pytest.fixture
+def wait_for():
+    """A function that polls until a condition is true."""
+
+    return _wait_for
@@ -7,16 +7,104 @@ Created  8/16/2025 - Paul Puhnaty
 """
 
 
-from Banner import KeyMonitorBanner
+import argparse
+import signal
+from time import time
+import appdirs
+from Instance import SingleInstance
 from Spy import WindowWatcher
+from Dispatch import CallbackExecutor, SynchronousExecutor
+from State import AppState, StateStore
+from Profiler import PROFILER
 
 
 def main():
     """Entry point of the application."""
 
-    app = App()
+    parser = argparse.ArgumentParser(description='Key File Monitor')
+    parser.add_argument(
+        '--selection',
+        choices=[App.SELECT_FROM_DIALOG, App.SELECT_FROM_LABEL],
+        default=App.SELECT_FROM_DIALOG,
+        help='Follow the "Open" dialog as the user types, or read the '
+             'Key Loader\'s own filename label when it changes.'
+    )
+    parser.add_argument(
+        '--sync-callbacks',
+        action='store_true',
+        help='Run window callbacks on the hook thread instead of a worker pool.'
+    )
+    parser.add_argument(
+        '--callback-queue',
+        type=int,
+        default=64,
+        help='How many callbacks may wait for a worker before keystrokes are held back.'
+    )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='Run without the banner, writing events as JSON lines instead.'
+    )
+    parser.add_argument(
+        '--output',
+        default='-',
+        help='File the headless events are appended to (default stdout).'
+    )
+    parser.add_argument(
+        '--reload-settings',
+        action='store_true',
+        help='Ask the running monitor to reload its settings.'
+    )
+    args = parser.parse_args()
+
+    # Hand over to the running monitor before Tk is ever loaded
+    instance = SingleInstance(appdirs.user_data_dir('KeyFileMonitor'))
+
+    if not instance.acquire():
+        instance.send(
+            SingleInstance.RELOAD if args.reload_settings else SingleInstance.FOCUS
+        )
+        return
+
+    if args.sync_callbacks:
+        executor = SynchronousExecutor()
+
+    else:
+        executor = CallbackExecutor(queue_limit=args.callback_queue)
+
+    if args.headless:
+        from Headless import EventLog, HeadlessView, open_output
+
+        # Opened first, so every diagnostic from here on avoids the events
+        stream = open_output(args.output)
+
+        if stream is None:
+            parser.error('--output FILE is required when there is no console')
+
+    PROFILER.start_from_environment()
+
+    if args.headless:
+        log = EventLog(stream)
+        view = HeadlessView(log)
+
+        # A service manager stops the monitor with SIGTERM
+        signal.signal(signal.SIGTERM, lambda signum, frame: view.close())
+
+        app = App(selection=args.selection, executor=executor, view=view)
+        log.watch(app.store)
+
+    else:
+        app = App(selection=args.selection, executor=executor)
+
+    instance.set_handler(app.on_instance_request)
     app.startup()
 
+    # The watcher leaves an executor it was given for its owner to stop
+    if not executor.shutdown(2.0):
+        print('Callback workers still running at exit')
+
+    instance.release()
+
 
 
 class App:
@@ -25,10 +113,45 @@ class App:
     KEY_LOADER_TITLE = 'Key Loader R8B'
     OPEN_KEY_FILE_DIALOG_TITLE = 'Open a Distribituion Key File...'
 
-    def __init__(self):
-        """Configure the components of the application."""
+    # The label in the Key Loader window that shows the loaded file. These
+    # are assumptions that have not been checked against the R8B software.
+    # The demo loader draws its label with Tk, so it cannot be read this way.
+    KEY_LOADER_LABEL_CLASS = 'Static'
+    KEY_LOADER_LABEL_INDEX = 0
+    KEY_LOADER_LABEL_PLACEHOLDER = 'No file selected'
+
+    SELECT_FROM_DIALOG = 'dialog'
+    SELECT_FROM_LABEL = 'label'
+
+    def __init__(self, selection=SELECT_FROM_DIALOG, desktop=None, executor=None, view=None):
+        """
+        Configure the components of the application.
+
+        Args:
+            selection (str): Where the selected filename is read from, either
+                             SELECT_FROM_DIALOG or SELECT_FROM_LABEL
+                             (default SELECT_FROM_DIALOG).
+            desktop (Win32Desktop, SimulatedDesktop): Passed on to the
+                                                      WindowWatcher
+                                                      (default Win32Desktop).
+            executor (CallbackExecutor): Runs the WindowWatcher callbacks
+                                         (default a new CallbackExecutor).
+            view (HeadlessView): Used in place of the banner window
+                                 (default a new KeyMonitorBanner).
+        """
+
+        self.store = StateStore(
+            AppState(pending_filename="This is the selected key filename")
+        )
+
+        self.spy = WindowWatcher(
+            store=self.store,
+            desktop=desktop,
+            executor=executor
+        )
 
-        self.spy = WindowWatcher()
+        # Find everything that is already open in one pass
+        self.spy.take_snapshot()
 
         key_loader_hwnd = self.spy.target_window(
             self.KEY_LOADER_TITLE,
@@ -36,54 +159,111 @@ class App:
             self.on_keyloader_shutdown
         )
 
-        self.buffered_filename = "This is the selected key filename"
+        if selection == self.SELECT_FROM_LABEL:
+            self.spy.target_label(
+                self.KEY_LOADER_LABEL_CLASS,
+                self.on_keyloader_label_change,
+                self.KEY_LOADER_LABEL_INDEX,
+                self.KEY_LOADER_LABEL_PLACEHOLDER
+            )
 
-        self.spy.target_dialog(
-            self.OPEN_KEY_FILE_DIALOG_TITLE,
-            self.on_select_file_startup,
-            self.on_select_file_shutdown,
-            self.on_select_file_edit
-        )
+        else:
+            self.spy.target_dialog(
+                self.OPEN_KEY_FILE_DIALOG_TITLE,
+                self.on_select_file_startup,
+                self.on_select_file_shutdown,
+                self.on_select_file_edit
+            )
+
+        if view is not None:
+            self.window = view
+
+        else:
+            # Imported here so headless runs never load tkinter
+            from Banner import KeyMonitorBanner
+            self.window = KeyMonitorBanner(key_loader_hwnd, desktop=self.spy.desktop)
 
-        self.window = KeyMonitorBanner(key_loader_hwnd)
+        # Subscribe first, so a selection read from the snapshot is never missed
+        self.store.subscribe(self.on_state_changed)
+
+        if self.store.state.committed_filename:
+            self.window.set_filename(self.store.state.committed_filename)
 
 
     def startup(self):
         """Start the application."""
 
         self.spy.start()
-        self.window.show()
-        self.spy.stop()
 
+        try:
+            self.window.show()
+
+        finally:
+            self.spy.stop()
+            PROFILER.stop()
+
+
+    def on_instance_request(self, command):
+        """Handle a request passed on by a second launch of the monitor."""
+
+        if command == SingleInstance.FOCUS:
+            self.window.focus()
+
+        elif command == SingleInstance.RELOAD:
+            self.window.reload_settings()
 
+
+    @PROFILER.timed
     def on_keyloader_startup(self, hwnd):
         """Connect to the keyloader when it is started."""
 
         self.window.attach_to_window(hwnd)
 
 
+    @PROFILER.timed
     def on_keyloader_shutdown(self):
         """Close this app along with the sibling app."""
 
         self.window.close()
 
 
+    @PROFILER.timed
     def on_select_file_startup(self, hwnd):
         """Do nothing when the "Open" dialog appears."""
 
         pass
 
 
+    @PROFILER.timed
     def on_select_file_edit(self, filename):
-        """Edit the buffered filename when the filename changes in the "Open" dialog."""
+        """Edit the pending filename when the filename changes in the "Open" dialog."""
 
-        self.buffered_filename = filename
+        self.store.update(pending_filename=filename)
 
 
+    @PROFILER.timed
     def on_select_file_shutdown(self):
-        """Apply the buffered filename when the "Open" dialog closes."""
+        """Commit the pending filename when the "Open" dialog closes."""
+
+        self.store.update(
+            committed_filename=self.store.state.pending_filename,
+            committed_time=time()
+        )
+
+
+    @PROFILER.timed
+    def on_keyloader_label_change(self, filename):
+        """Commit the filename shown by the Key Loader itself."""
+
+        self.store.update(committed_filename=filename, committed_time=time())
+
+
+    @PROFILER.timed
+    def on_state_changed(self, diff, state):
+        """Refresh the banner when a selection is committed, even the same file again."""
 
-        self.window.set_filename(self.buffered_filename)
+        if 'committed_filename' in diff or 'committed_time' in diff:
+            self.window.set_filename(state.committed_filename)
 
 
 
@@ -0,0 +1,301 @@
+"""
+Soak Test.
+
+Drives thousands of simulated Key Loader cycles through the App with the
+banner hidden, and watches memory, thread and Tk widget counts for growth.
+Exits with status 1 if anything grows faster than allowed.
+
+Usage: python soak.py [--cycles N] [--interval N] [--threshold BYTES]
+"""
+
+import argparse
+import gc
+import sys
+import threading
+import tracemalloc
+from time import sleep, monotonic
+
+from Banner import Tooltip
+from Simulator import SimulatedDesktop, SimulatedKeyLoader
+from main import App
+
+
+def main():
+    """Entry point of the soak test."""
+
+    parser = argparse.ArgumentParser(description='Key File Monitor soak test')
+    parser.add_argument('--cycles', type=int, default=2000,
+                        help='Number of dialog/selection cycles to run.')
+    parser.add_argument('--interval', type=int, default=100,
+                        help='Cycles between memory snapshots.')
+    parser.add_argument('--threshold', type=float, default=256,
+                        help='Allowed memory growth per cycle, in bytes.')
+    parser.add_argument('--selection', default=App.SELECT_FROM_DIALOG,
+                        choices=[App.SELECT_FROM_DIALOG, App.SELECT_FROM_LABEL],
+                        help='Selection mode of the App under test.')
+    args = parser.parse_args()
+
+    soak = SoakTest(args.cycles, args.interval, args.threshold, args.selection)
+    sys.exit(0 if soak.run() else 1)
+
+
+
+class SoakApp(App):
+    """An App that stays open when the simulated Key Loader closes."""
+
+    def on_keyloader_shutdown(self):
+        """Keep running so the Key Loader can be relaunched."""
+
+        pass
+
+
+
+class SoakTest:
+    """Runs the App against a SimulatedKeyLoader and measures growth."""
+
+    RELAUNCH_EVERY = 50
+    CANCEL_EVERY = 5
+    KEY_NAMES = 7
+    TOP_SITES = 10
+    TIMEOUT = 5.0
+
+
+    class Sample:
+        """Holds the measurements taken after one interval."""
+
+        def __init__(self, cycle, memory, threads, widgets, snapshot):
+            """Contruct a Sample."""
+
+            self.cycle = cycle
+            self.memory = memory
+            self.threads = threads
+            self.widgets = widgets
+            self.snapshot = snapshot
+
+
+    def __init__(self, cycles: int, interval: int, threshold: float, selection: str):
+        """
+        Initialize a soak test.
+
+        Args:
+            cycles (int): Number of dialog/selection cycles to run.
+            interval (int): Cycles between samples. The first sample is the
+                            baseline, taken once everything has warmed up.
+            threshold (float): Allowed memory growth per cycle, in bytes.
+            selection (str): Selection mode of the App under test.
+        """
+
+        self.cycles = cycles
+        self.interval = interval
+        self.threshold = threshold
+        self.selection = selection
+
+        self.samples = []
+        self.error = None
+
+
+    def run(self) -> bool:
+        """
+        Run the soak test and print a report.
+
+        Returns:
+            bool - True if nothing grew faster than allowed.
+        """
+
+        tracemalloc.start(10)
+
+        self.desktop = SimulatedDesktop()
+        self.loader = SimulatedKeyLoader(
+            self.desktop,
+            label_class=App.KEY_LOADER_LABEL_CLASS if self.selection == App.SELECT_FROM_LABEL else None
+        )
+        self.loader.launch()
+
+        self.app = SoakApp(selection=self.selection, desktop=self.desktop)
+        self.app.window.root.withdraw()
+        self.tooltip = Tooltip(self.app.window.outer_frame, 'Soak test', delay=0)
+
+        self.app.spy.start()
+
+        driver = threading.Thread(target=self._drive, daemon=True)
+        driver.start()
+
+        self.app.window.show()
+        self.app.spy.stop()
+        driver.join()
+
+        tracemalloc.stop()
+        return self._report()
+
+
+    def _drive(self):
+        """Run the cycles (runs in a background thread while Tk runs)."""
+
+        try:
+            for cycle in range(1, self.cycles + 1):
+                self._cycle(cycle)
+
+                if cycle % self.interval == 0:
+                    self._sample(cycle)
+
+        except Exception as error:
+            self.error = error
+
+        finally:
+            self.app.window.close()
+
+
+    def _cycle(self, cycle):
+        """Relaunch the loader now and then, and select or cancel a key file."""
+
+        if cycle % self.RELAUNCH_EVERY == 0:
+            self.loader.close()
+            self.loader.launch()
+            self._settle()
+
+        self.loader.open_dialog()
+
+        if self.selection == App.SELECT_FROM_DIALOG:
+            # The watcher polls for the dialog, typing must wait until it is found
+            self._wait_for(lambda: self.app.store.state.edit_hwnd == self.loader.edit)
+
+        filename = f'C:/Keys/key{cycle % self.KEY_NAMES}.key'
+
+        if cycle % self.CANCEL_EVERY == 0:
+            self.loader.cancel(filename)
+
+        else:
+            self.loader.choose(filename)
+
+        self._settle()
+        self._on_tk(self.tooltip.show)
+        self._on_tk(self.tooltip.hide)
+
+
+    def _sample(self, cycle):
+        """Take a tracemalloc snapshot and count threads and widgets."""
+
+        self._settle()
+        gc.collect()
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+
+        sample = self.Sample(
+            cycle,
+            tracemalloc.get_traced_memory()[0],
+            threading.active_count(),
+            self._on_tk(self._count_widgets),
+            snapshot
+        )
+
+        # Only the baseline and latest snapshots are needed for the report
+        if len(self.samples) > 1:
+            self.samples[-1].snapshot = None
+
+        self.samples.append(sample)
+
+        print(
+            f'cycle {cycle:6}  memory {sample.memory:10,} B  '
+            f'threads {sample.threads:3}  widgets {sample.widgets:4}'
+        )
+
+
+    def _report(self) -> bool:
+        """Print the growth between the baseline and the last sample."""
+
+        if self.error:
+            print('Soak test failed:', repr(self.error))
+            return False
+
+        if len(self.samples) < 2:
+            print('Soak test needs at least two samples, increase --cycles')
+            return False
+
+        first, last = self.samples[0], self.samples[-1]
+        cycles = last.cycle - first.cycle
+        per_cycle = (last.memory - first.memory) / cycles
+
+        print(f'\nTop {self.TOP_SITES} growth sites over {cycles} cycles:')
+
+        for stat in last.snapshot.compare_to(first.snapshot, 'lineno')[:self.TOP_SITES]:
+            print(f'  {stat.size_diff:+10,} B {stat.count_diff:+7} blocks  {stat.traceback}')
+
+        problems = []
+
+        if per_cycle > self.threshold:
+            problems.append(f'memory grew {per_cycle:.1f} B/cycle (limit {self.threshold:g})')
+
+        if last.threads > first.threads:
+            problems.append(f'threads grew from {first.threads} to {last.threads}')
+
+        if last.widgets > first.widgets:
+            problems.append(f'widgets grew from {first.widgets} to {last.widgets}')
+
+        print(f'\nMemory growth: {per_cycle:.1f} B/cycle')
+
+        for problem in problems:
+            print('FAIL:', problem)
+
+        if not problems:
+            print('PASS')
+
+        return not problems
+
+
+    def _settle(self):
+        """Wait until every simulated event and callback has been handled."""
+
+        self.desktop.flush()
+        self.app.spy.executor.wait_idle()
+        self._on_tk(lambda: None)
+
+
+    def _wait_for(self, condition):
+        """Poll until a condition holds."""
+
+        deadline = monotonic() + self.TIMEOUT
+
+        while not condition():
+            if monotonic() > deadline:
+                raise TimeoutError('Simulated window was not picked up by the watcher')
+
+            sleep(0.005)
+
+
+    def _on_tk(self, function):
+        """Run a function on the Tk thread and return its result."""
+
+        done = threading.Event()
+        result = []
+
+        def call():
+            result.append(function())
+            done.set()
+
+        self.app.window.root.after(0, call)
+
+        if not done.wait(self.TIMEOUT):
+            raise TimeoutError('Tk thread did not respond')
+
+        return result[0]
+
+
+    def _count_widgets(self):
+        """Count every widget that belongs to the banner's Tk root."""
+
+        pending = [self.app.window.root]
+        count = 0
+
+        while pending:
+            widget = pending.pop()
+            pending.extend(widget.winfo_children())
+            count += 1
+
+        return count
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Check the ordering, coalescing and rejection rules of the executors."""
+
+import threading
+import pytest
+from Dispatch import CallbackExecutor, SynchronousExecutor
+
+
+
+@pytest.fixture
+def blocked():
+    """An executor with one worker, held busy until the gate is opened."""
+
+    executor = CallbackExecutor(workers=1, queue_limit=1)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        gate.wait()
+
+    executor.submit('window', block)
+    started.wait(1.0)
+
+    yield executor, gate
+
+    gate.set()
+    executor.shutdown(1.0)
+
+
+def test_callbacks_keep_their_order_per_target():
+    executor = CallbackExecutor(workers=3)
+    calls = {target: [] for target in ('window', 'dialog', 'label')}
+
+    for number in range(200):
+        for target, seen in calls.items():
+            executor.submit(target, seen.append, number)
+
+    executor.wait_idle()
+
+    assert all(seen == list(range(200)) for seen in calls.values())
+    assert executor.shutdown(1.0)
+
+
+def test_lifecycle_callbacks_are_never_rejected(blocked):
+    executor, gate = blocked
+    calls = []
+
+    for number in range(20):
+        assert executor.submit('dialog', calls.append, number)
+
+    gate.set()
+    executor.wait_idle()
+
+    assert calls == list(range(20))
+    assert executor.stats.report()['rejected'] == 0
+
+
+def test_waiting_keystrokes_are_merged_into_the_latest(blocked):
+    executor, gate = blocked
+    calls = []
+
+    def on_edit(text):
+        calls.append(('edit', text))
+
+    executor.submit('dialog', calls.append, 'create')
+
+    for end in range(1, 6):
+        assert executor.submit('dialog', on_edit, 'abcde'[:end], coalesce=True)
+
+    executor.submit('dialog', calls.append, 'destroy')
+
+    gate.set()
+    executor.wait_idle()
+
+    # The latest text is seen before the dialog closes
+    assert calls == ['create', ('edit', 'abcde'), 'destroy']
+    assert executor.stats.report()['coalesced'] == 4
+    assert executor.stats.report()['rejected'] == 0
+
+
+def test_latest_keystroke_is_held_while_the_queue_is_full(blocked):
+    executor, gate = blocked
+    calls = []
+
+    def on_edit(text):
+        calls.append(text)
+
+    executor.submit('dialog', calls.append, 'create')
+
+    for end in range(1, 6):
+        executor.submit('dialog', on_edit, 'abcde'[:end], coalesce=True)
+
+    # Nothing follows, so the worker has to queue the held keystroke itself
+    gate.set()
+    executor.wait_idle()
+
+    assert calls == ['create', 'abcde']
+
+
+def test_a_different_held_callback_is_dropped_for_the_newest(blocked):
+    executor, gate = blocked
+    calls = []
+
+    def first(text):
+        calls.append(('first', text))
+
+    def second(text):
+        calls.append(('second', text))
+
+    executor.submit('dialog', calls.append, 'create')
+
+    assert executor.submit('dialog', first, 'a', coalesce=True)
+    assert not executor.submit('dialog', second, 'b', coalesce=True)
+
+    gate.set()
+    executor.wait_idle()
+
+    assert calls == ['create', ('second', 'b')]
+    assert executor.stats.report()['rejected'] == 1
+
+
+def test_failures_are_counted_and_do_not_stop_the_worker():
+    executor = CallbackExecutor(workers=1)
+    calls = []
+
+    def fail():
+        raise RuntimeError('callback failed')
+
+    executor.submit('window', fail)
+    executor.submit('window', calls.append, 'after')
+    executor.wait_idle()
+
+    assert calls == ['after']
+    assert executor.stats.report()['failed'] == 1
+    assert executor.shutdown(1.0)
+
+
+def test_synchronous_executor_runs_on_the_calling_thread():
+    executor = SynchronousExecutor()
+    threads = []
+
+    executor.submit('window', lambda: threads.append(threading.get_ident()), coalesce=True)
+
+    assert threads == [threading.get_ident()]
+    assert executor.stats.report()['completed'] == 1
+
+
+def test_shut_down_executor_drops_callbacks_until_started_again():
+    executor = CallbackExecutor(workers=1)
+    calls = []
+
+    assert executor.shutdown(1.0)
+    assert not executor.submit('window', calls.append, 'lost')
+
+    executor.start()
+    assert executor.submit('window', calls.append, 'kept')
+    executor.wait_idle()
+
+    assert calls == ['kept']
+    assert executor.stats.report()['rejected'] == 1
+    assert executor.shutdown(1.0)
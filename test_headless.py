@@ -0,0 +1,148 @@
+"""Check the headless event log and its output."""
+
+import io
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+import Headless
+from Headless import EventLog, HeadlessView
+from State import AppState, StateStore
+
+
+
+def events(stream):
+    """Parse the JSON lines written to a stream."""
+
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_events_are_only_written_by_flush():
+    store = StateStore()
+    stream = io.StringIO()
+    log = EventLog(stream)
+    log.watch(store)
+
+    store.update(loader_hwnd=5)
+
+    assert stream.getvalue() == ''
+
+    log.flush()
+
+    assert [event['event'] for event in events(stream)] == [EventLog.LOADER_ATTACHED]
+
+
+def test_current_state_is_logged_before_changes():
+    store = StateStore(AppState(loader_hwnd=5, committed_filename='C:/keys/alpha.key', committed_time=1.0))
+    stream = io.StringIO()
+    log = EventLog(stream)
+    log.watch(store)
+
+    store.update(dialog_hwnd=7)
+    store.update(dialog_hwnd=0, committed_filename='C:/keys/bravo.key', committed_time=2.0)
+
+    # Selecting the same file again is still a selection
+    store.update(committed_time=3.0)
+    log.flush()
+
+    logged = [(event['event'], event.get('hwnd', event.get('name'))) for event in events(stream)]
+
+    assert logged == [
+        (EventLog.LOADER_ATTACHED, 5),
+        (EventLog.SELECTION_COMMITTED, 'alpha.key'),
+        (EventLog.DIALOG_OPENED, 7),
+        (EventLog.DIALOG_CLOSED, 7),
+        (EventLog.SELECTION_COMMITTED, 'bravo.key'),
+        (EventLog.SELECTION_COMMITTED, 'bravo.key'),
+    ]
+
+
+def test_show_writes_queued_events_when_interrupted(monkeypatch):
+    store = StateStore()
+    stream = io.StringIO()
+    log = EventLog(stream, flush_interval=0.01)
+    log.watch(store)
+    polls = []
+
+    def interrupt():
+        polls.append(True)
+        store.update(loader_hwnd=5)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(Headless.PROFILER, 'poll_signal_file', interrupt)
+
+    HeadlessView(log).show()
+
+    assert polls
+    assert [event['event'] for event in events(stream)] == [EventLog.LOADER_ATTACHED]
+
+
+def test_show_returns_once_closed():
+    stream = io.StringIO()
+    view = HeadlessView(EventLog(stream, flush_interval=0.01))
+    thread = threading.Thread(target=view.show)
+    thread.start()
+
+    view.close()
+    thread.join(1.0)
+
+    assert not thread.is_alive()
+
+
+SIMULATED_RUN = r'''
+import time
+from Headless import EventLog, HeadlessView, open_output
+from Simulator import SimulatedDesktop, SimulatedKeyLoader
+from main import App
+
+stream = open_output('-')
+desktop = SimulatedDesktop()
+loader = SimulatedKeyLoader(desktop)
+loader.launch()
+
+log = EventLog(stream, flush_interval=0.01)
+view = HeadlessView(log)
+app = App(desktop=desktop, view=view)
+log.watch(app.store)
+
+app.spy.start()
+
+while desktop.hook_count < 4:
+    time.sleep(0.005)
+
+loader.open_dialog()
+
+while app.store.state.edit_hwnd != loader.edit:
+    time.sleep(0.005)
+
+loader.choose('C:/keys/alpha.key')
+loader.close()
+app.spy.executor.wait_idle()
+app.startup()
+'''
+
+
+def test_stdout_holds_only_events():
+    result = subprocess.run(
+        [sys.executable, '-c', SIMULATED_RUN],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+
+    assert result.returncode == 0, result.stderr
+
+    logged = [json.loads(line)['event'] for line in result.stdout.splitlines()]
+
+    assert logged == [
+        EventLog.LOADER_ATTACHED,
+        EventLog.DIALOG_OPENED,
+        EventLog.DIALOG_CLOSED,
+        EventLog.SELECTION_COMMITTED,
+        EventLog.LOADER_DETACHED,
+    ]
+
+    # The diagnostics went to stderr instead
+    assert 'Spy is starting' in result.stderr
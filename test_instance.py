@@ -0,0 +1,42 @@
+"""Exercise the single instance hand-off with real lock files and sockets."""
+
+import queue
+from Instance import SingleInstance
+
+
+
+def test_second_instance_hands_over_and_exits(tmp_path):
+    first = SingleInstance(tmp_path)
+    second = SingleInstance(tmp_path)
+
+    assert first.acquire()
+
+    try:
+        assert not second.acquire()
+
+        # Requests that arrive before the handler is set are kept
+        assert second.send(SingleInstance.FOCUS)
+
+        received = queue.Queue()
+        first.set_handler(received.put)
+
+        assert received.get(timeout=1.0) == SingleInstance.FOCUS
+
+        assert second.send(SingleInstance.RELOAD)
+        assert received.get(timeout=1.0) == SingleInstance.RELOAD
+
+    finally:
+        first.release()
+
+    # Once released, the next launch becomes the running instance
+    third = SingleInstance(tmp_path)
+
+    try:
+        assert third.acquire()
+
+    finally:
+        third.release()
+
+
+def test_send_without_running_instance_gives_up(tmp_path):
+    assert not SingleInstance(tmp_path).send(SingleInstance.FOCUS, timeout=0.1)
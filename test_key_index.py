@@ -0,0 +1,115 @@
+"""Check the key library index and its incremental rescans."""
+
+import hashlib
+import os
+import pytest
+from KeyIndex import KeyIndexer
+
+
+
+@pytest.fixture
+def library(tmp_path):
+    """A key directory with two files, and an indexer for it."""
+
+    keys = tmp_path / 'Key Files'
+    (keys / 'old').mkdir(parents=True)
+    (keys / 'alpha.key').write_bytes(b'alpha')
+    (keys / 'old' / 'bravo.key').write_bytes(b'bravo')
+
+    approved = [hashlib.sha256(b'alpha').hexdigest()]
+    indexer = KeyIndexer([keys], tmp_path / 'key_index.json', approved, workers=2)
+
+    return keys, indexer
+
+
+def test_first_scan_hashes_everything(library):
+    keys, indexer = library
+
+    assert not indexer.scanned
+
+    stats = indexer.scan()
+
+    assert indexer.scanned
+    assert (stats['files'], stats['hashed'], stats['removed']) == (2, 2, 0)
+
+    alpha, = indexer.lookup(os.path.join('elsewhere', 'ALPHA.key'))
+    assert alpha.digest == hashlib.sha256(b'alpha').hexdigest()
+    assert alpha.approved
+    assert not indexer.lookup('bravo.key')[0].approved
+    assert indexer.lookup('charlie.key') == []
+
+
+def test_rescan_only_hashes_changed_files(library):
+    keys, indexer = library
+    indexer.scan()
+    indexer.save()
+
+    # A fresh run starts from the saved index
+    rerun = KeyIndexer([keys], indexer.index_path, workers=2)
+    rerun.load()
+
+    assert not rerun.scanned
+    assert len(rerun.lookup('alpha.key')) == 1
+
+    assert rerun.scan()['hashed'] == 0
+
+    (keys / 'alpha.key').write_bytes(b'alpha, longer')
+    os.remove(keys / 'old' / 'bravo.key')
+    (keys / 'charlie.key').write_bytes(b'charlie')
+
+    stats = rerun.scan()
+
+    assert (stats['files'], stats['hashed'], stats['removed']) == (2, 2, 1)
+    assert rerun.lookup('alpha.key')[0].digest == hashlib.sha256(b'alpha, longer').hexdigest()
+    assert rerun.lookup('bravo.key') == []
+
+
+def test_collisions_are_reported(library):
+    keys, indexer = library
+    (keys / 'old' / 'alpha.key').write_bytes(b'another alpha')
+    indexer.scan()
+
+    assert indexer.is_collision('alpha.key')
+    assert not indexer.is_collision('bravo.key')
+
+
+@pytest.mark.parametrize('contents', [
+    'not json',
+    '{"name": "alpha.key"}',
+    '[{"name": "alpha.key"}]',
+    '[{"unexpected": 1}]',
+    '[1, 2]',
+])
+def test_malformed_index_is_ignored_and_rebuilt(library, contents):
+    keys, indexer = library
+    indexer.index_path.write_text(contents, encoding='utf-8')
+
+    indexer.load()
+
+    assert indexer.lookup('alpha.key') == []
+    assert indexer.scan()['hashed'] == 2
+
+
+def test_unreadable_entry_does_not_hide_the_rest(library, monkeypatch):
+    keys, indexer = library
+    real_scandir = os.scandir
+
+    class Unreadable:
+        path = str(keys / 'locked.key')
+
+        def is_dir(self, follow_symlinks=True):
+            raise PermissionError(self.path)
+
+    class Listing:
+        def __init__(self, path):
+            self.listing = real_scandir(path)
+
+        def __enter__(self):
+            return [Unreadable()] + list(self.listing)
+
+        def __exit__(self, *exc_info):
+            self.listing.close()
+
+    monkeypatch.setattr(os, 'scandir', Listing)
+
+    assert indexer.scan()['files'] == 2
@@ -0,0 +1,137 @@
+"""Exercise the label selection mode against the simulated desktop."""
+
+from Simulator import SimulatedKeyLoader
+from Dispatch import CallbackExecutor
+from main import App
+
+
+
+def start_app(desktop, view, wait_for, selection):
+    """Start an App on the desktop once its hooks are installed."""
+
+    executor = CallbackExecutor()
+    app = App(selection=selection, desktop=desktop, executor=executor, view=view)
+
+    # Create and show hooks, plus destroy and text change while the loader exists
+    hooks = 4 if app.store.state.loader_hwnd else 2
+
+    app.spy.start()
+    wait_for(lambda: desktop.hook_count == hooks)
+
+    return app, executor
+
+
+def settle(desktop, executor):
+    """Wait until every event and callback has been handled."""
+
+    desktop.flush()
+    executor.wait_idle()
+
+
+def test_label_mode_commits_chosen_files_and_ignores_cancel(desktop, view, wait_for):
+    loader = SimulatedKeyLoader(desktop, label_class=App.KEY_LOADER_LABEL_CLASS)
+    loader.launch()
+
+    app, executor = start_app(desktop, view, wait_for, App.SELECT_FROM_LABEL)
+
+    try:
+        settle(desktop, executor)
+
+        # The placeholder is never committed
+        assert app.store.state.committed_filename == ''
+        assert view.filenames == []
+
+        loader.open_dialog()
+        loader.choose('C:\\Key Files\\alpha.key')
+        settle(desktop, executor)
+
+        assert app.store.state.committed_filename == 'C:\\Key Files\\alpha.key'
+
+        loader.open_dialog()
+        loader.cancel('C:\\Key Files\\bravo.key')
+        settle(desktop, executor)
+
+        assert app.store.state.committed_filename == 'C:\\Key Files\\alpha.key'
+        assert view.filenames == ['C:\\Key Files\\alpha.key']
+
+        loader.close()
+        settle(desktop, executor)
+
+        assert view.closed
+        assert app.store.state.loader_hwnd == 0
+
+    finally:
+        app.spy.stop()
+
+    assert desktop.hook_count == 0
+
+
+def test_label_mode_reads_label_when_loader_starts_later(desktop, view, wait_for):
+    app, executor = start_app(desktop, view, wait_for, App.SELECT_FROM_LABEL)
+
+    try:
+        loader = SimulatedKeyLoader(desktop, label_class=App.KEY_LOADER_LABEL_CLASS)
+        loader.launch()
+        settle(desktop, executor)
+
+        assert app.store.state.label_hwnd == loader.label
+
+        loader.open_dialog()
+        loader.choose('C:\\Key Files\\charlie.key')
+        settle(desktop, executor)
+
+        assert view.filenames == ['C:\\Key Files\\charlie.key']
+
+    finally:
+        app.spy.stop()
+
+
+def test_label_mode_finds_nothing_in_a_tk_label(desktop, view, wait_for):
+    # Like demo_keyloader.py, whose label is drawn by Tk
+    loader = SimulatedKeyLoader(desktop)
+    loader.launch()
+
+    app, executor = start_app(desktop, view, wait_for, App.SELECT_FROM_LABEL)
+
+    try:
+        loader.open_dialog()
+        loader.choose('C:\\Key Files\\delta.key')
+        settle(desktop, executor)
+
+        assert app.store.state.label_hwnd == 0
+        assert view.filenames == []
+
+    finally:
+        app.spy.stop()
+
+
+def test_label_hooks_ignore_other_processes(desktop, view, wait_for):
+    loader = SimulatedKeyLoader(desktop, label_class=App.KEY_LOADER_LABEL_CLASS)
+    loader.launch()
+
+    # Another program's window, busy with text changes of every kind
+    other = desktop.create_window('Edit', 'Notes', pid=2000)
+
+    app, executor = start_app(desktop, view, wait_for, App.SELECT_FROM_LABEL)
+
+    try:
+        settle(desktop, executor)
+        before = sum(app.spy._callback_counts.values())
+
+        for event in range(0x800C, 0x800F):
+            for number in range(50):
+                desktop.set_text(other, f'Notes {number}', event)
+
+        settle(desktop, executor)
+
+        assert sum(app.spy._callback_counts.values()) == before
+
+        # The loader's own label is still followed
+        loader.open_dialog()
+        loader.choose('C:\\Key Files\\foxtrot.key')
+        settle(desktop, executor)
+
+        assert view.filenames == ['C:\\Key Files\\foxtrot.key']
+
+    finally:
+        app.spy.stop()
@@ -0,0 +1,54 @@
+"""Exercise startup from a desktop snapshot against the simulated desktop."""
+
+from Simulator import SimulatedKeyLoader
+from Dispatch import CallbackExecutor
+from Snapshot import DesktopSnapshot
+from main import App
+
+
+
+def test_snapshot_indexes_top_level_windows(desktop):
+    loader = SimulatedKeyLoader(desktop)
+    loader.launch()
+    loader.open_dialog()
+
+    snapshot = DesktopSnapshot.take(desktop)
+
+    assert snapshot.find(None, SimulatedKeyLoader.TITLE) == loader.hwnd
+    assert snapshot.find('#32770', SimulatedKeyLoader.DIALOG_TITLE) == loader.dialog
+    assert snapshot.find(None, 'Not a window') == 0
+
+
+def test_dialog_already_open_at_startup(desktop, view, wait_for):
+    loader = SimulatedKeyLoader(desktop)
+    loader.launch()
+    loader.open_dialog()
+    loader.type('C:\\Key Files\\ech')
+
+    executor = CallbackExecutor()
+    app = App(desktop=desktop, executor=executor, view=view)
+
+    # What was typed before startup is picked up from the snapshot
+    executor.wait_idle()
+    state = app.store.state
+
+    assert state.loader_hwnd == loader.hwnd
+    assert state.dialog_hwnd == loader.dialog
+    assert state.edit_hwnd == loader.edit
+    assert state.pending_filename == 'C:\\Key Files\\ech'
+
+    app.spy.start()
+
+    try:
+        wait_for(lambda: desktop.hook_count == 4)
+
+        # Typing goes on from there and the dialog closing commits it
+        loader.choose('C:\\Key Files\\echo.key')
+        desktop.flush()
+        executor.wait_idle()
+
+        assert app.store.state.committed_filename == 'C:\\Key Files\\echo.key'
+        assert view.filenames == ['C:\\Key Files\\echo.key']
+
+    finally:
+        app.spy.stop()
@@ -0,0 +1,79 @@
+"""Check the StateStore change and notification rules."""
+
+import pytest
+from State import AppState, StateStore
+
+
+
+def test_update_reports_only_changed_fields():
+    store = StateStore(AppState(loader_hwnd=1, committed_filename='a.key'))
+    changes = []
+    store.subscribe(lambda diff, state: changes.append((diff, state)))
+
+    new = store.update(loader_hwnd=1, committed_filename='b.key')
+
+    assert new.version == 1
+    assert new.loader_hwnd == 1
+    assert store.state is new
+    assert changes == [({'committed_filename': ('a.key', 'b.key')}, new)]
+
+
+def test_update_without_changes_is_a_no_op():
+    store = StateStore(AppState(committed_filename='a.key'))
+    changes = []
+    store.subscribe(lambda diff, state: changes.append(diff))
+    before = store.state
+
+    assert store.update(committed_filename='a.key') is before
+    assert store.update() is before
+    assert store.state.version == 0
+    assert changes == []
+
+
+def test_update_rejects_unknown_fields():
+    store = StateStore()
+
+    with pytest.raises(AttributeError):
+        store.update(filename='a.key')
+
+    with pytest.raises(AttributeError):
+        store.update(version=5)
+
+    assert store.state.version == 0
+
+
+def test_states_are_immutable_snapshots():
+    store = StateStore()
+    first = store.state
+    store.update(dialog_hwnd=7)
+
+    assert first.dialog_hwnd == 0
+    assert store.state.dialog_hwnd == 7
+
+    with pytest.raises(AttributeError):
+        store.state.dialog_hwnd = 8
+
+
+def test_unsubscribe_stops_notifications():
+    store = StateStore()
+    changes = []
+
+    def record(diff, state):
+        changes.append(diff)
+
+    store.subscribe(record)
+    store.update(edit_hwnd=3)
+    store.unsubscribe(record)
+    store.update(edit_hwnd=4)
+
+    assert changes == [{'edit_hwnd': (0, 3)}]
+
+
+def test_subscribe_returns_and_replays_the_current_state():
+    store = StateStore(AppState(loader_hwnd=2, committed_filename='a.key'))
+    changes = []
+
+    state = store.subscribe(lambda diff, state: changes.append(diff), replay=True)
+
+    assert state is store.state
+    assert changes == [{'loader_hwnd': (0, 2), 'committed_filename': ('', 'a.key')}]
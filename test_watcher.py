@@ -0,0 +1,112 @@
+"""Check starting and stopping the WindowWatcher on the simulated desktop."""
+
+import threading
+import pytest
+from Simulator import SimulatedKeyLoader
+from Dispatch import CallbackExecutor
+from Spy import WindowWatcher
+
+
+
+def watch_loader(desktop, executor=None):
+    """A WindowWatcher following the Key Loader's main window."""
+
+    calls = []
+    watcher = WindowWatcher(desktop=desktop, executor=executor)
+    watcher.target_window(
+        SimulatedKeyLoader.TITLE,
+        lambda hwnd: calls.append('create'),
+        lambda: calls.append('destroy')
+    )
+
+    return watcher, calls
+
+
+def start(watcher, desktop, wait_for):
+    """Start the watcher once its hooks are installed."""
+
+    watcher.start()
+    wait_for(lambda: desktop.hook_count == 2)
+
+
+@pytest.mark.parametrize('given', [False, True])
+def test_watcher_can_be_restarted(desktop, wait_for, given):
+    executor = CallbackExecutor() if given else None
+    watcher, calls = watch_loader(desktop, executor)
+
+    start(watcher, desktop, wait_for)
+    watcher.stop()
+    start(watcher, desktop, wait_for)
+
+    try:
+        loader = SimulatedKeyLoader(desktop)
+        loader.launch()
+        desktop.flush()
+        loader.close()
+        desktop.flush()
+        watcher.executor.wait_idle()
+
+        assert calls == ['create', 'destroy']
+
+    finally:
+        watcher.stop()
+
+
+def test_watcher_only_shuts_down_its_own_executor(desktop, wait_for):
+    executor = CallbackExecutor()
+    watcher, _ = watch_loader(desktop, executor)
+
+    start(watcher, desktop, wait_for)
+    watcher.stop()
+
+    calls = []
+    assert executor.submit('window', calls.append, 'still running')
+    executor.wait_idle()
+
+    assert calls == ['still running']
+    assert executor.shutdown(1.0)
+
+
+def test_stop_wakes_the_dialog_poll_and_removes_the_hooks(desktop, wait_for):
+    loader = SimulatedKeyLoader(desktop)
+    loader.launch()
+
+    # The loader is already running, so the dialog is polled for at once
+    watcher, _ = watch_loader(desktop)
+    watcher.target_dialog(SimulatedKeyLoader.DIALOG_TITLE, print, print, print)
+    watcher.start()
+    wait_for(lambda: desktop.hook_count == 4)
+    wait_for(lambda: watcher._dialog_thread is not None)
+
+    elapsed = watcher.stop(timeout=1.0)
+
+    # Far shorter than a single dialog poll
+    assert elapsed < 0.15
+    assert desktop.hook_count == 0
+    assert not watcher._window_thread.is_alive()
+    assert not watcher._dialog_thread.is_alive()
+
+
+def test_stop_gives_up_on_a_stuck_callback_at_the_deadline(desktop, wait_for, capsys):
+    watcher, _ = watch_loader(desktop)
+    start(watcher, desktop, wait_for)
+
+    gate = threading.Event()
+    started = threading.Event()
+
+    def stuck():
+        started.set()
+        gate.wait()
+
+    watcher.executor.submit('window', stuck)
+    started.wait(1.0)
+
+    try:
+        elapsed = watcher.stop(timeout=0.2)
+
+    finally:
+        gate.set()
+
+    assert 0.2 <= elapsed < 0.5
+    assert desktop.hook_count == 0
+    assert 'still running: callback workers' in capsys.readouterr().out